@@ -17,8 +17,41 @@ BIN_DIR="${BASE_DIR}/bin"
 VNU_JAR="${BIN_DIR}/vnu.jar"
 IGNORE_FILE="${BASE_DIR}/validator/es_ignored_errors"
 HTML_FILE=$(mktemp)
+VNU_FILE=$(mktemp)
+# Validation results are cached by hash of the page content, ignore list and validator version
+CACHE_DIR="${ES_VALIDATOR_CACHE_DIR:-"${HOME}/.cache/esdc-validator"}"
+CACHE_MAX_AGE="${ES_VALIDATOR_CACHE_MAX_AGE:-30}"  # days
+CACHE_MAX_SIZE="${ES_VALIDATOR_CACHE_MAX_SIZE:-51200}"  # KB
 
-trap 'rm -f "${HTML_FILE}"' INT TERM EXIT
+trap 'rm -f "${HTML_FILE}" "${VNU_FILE}"' INT TERM EXIT
+
+_hash() {
+	if command -v sha256sum > /dev/null; then
+		sha256sum | cut -d ' ' -f 1
+	elif command -v digest > /dev/null; then
+		digest -a sha256
+	else
+		shasum -a 256 | cut -d ' ' -f 1
+	fi
+}
+
+cache_key() {
+	{
+		cat "${HTML_FILE}" "${IGNORE_FILE}"
+		ls -l "${VNU_JAR}" 2> /dev/null
+	} | _hash
+}
+
+cache_evict() {
+	find "${CACHE_DIR}" -type f -name '*.vnu' -mtime +"${CACHE_MAX_AGE}" -exec rm -f {} + 2> /dev/null
+
+	# Remove least recently used results until the cache fits into its size limit
+	while [[ $(du -sk "${CACHE_DIR}" | cut -f 1) -gt ${CACHE_MAX_SIZE} ]]; do
+		oldest="$(ls -tr "${CACHE_DIR}"/*.vnu 2> /dev/null | head -n 1)"
+		[[ -z "${oldest}" ]] && break
+		rm -f "${oldest}"
+	done
+}
 
 echo ">>> Downloading ${URL} ..." >&2
 curl -m ${TIMEOUT} -v -k -s -f -k -b "es_sessionid=${SESSIONID}" "${URL}" -o "${HTML_FILE}"
@@ -41,8 +74,29 @@ i=0
 err=0
 es_err=0
 
+CACHE_FILE=""
+
+if [[ "${CACHE_MAX_SIZE}" -gt 0 ]] && mkdir -p "${CACHE_DIR}" 2> /dev/null; then
+	CACHE_FILE="${CACHE_DIR}/$(cache_key).vnu"
+fi
+
 echo >&2
-echo ">>> Running validator ..." >&2
+if [[ -n "${CACHE_FILE}" && -f "${CACHE_FILE}" ]]; then
+	echo ">>> Using cached validator results ..." >&2
+	touch "${CACHE_FILE}"
+	cp "${CACHE_FILE}" "${VNU_FILE}"
+else
+	echo ">>> Running validator ..." >&2
+	java -jar "${VNU_JAR}" --errors-only --format gnu "${HTML_FILE}" > "${VNU_FILE}" 2>&1
+	vnu_rc=$?
+
+	# Do not cache failed validator runs (e.g. missing java)
+	if [[ -n "${CACHE_FILE}" && -f "${VNU_JAR}" && ${vnu_rc} -le 1 ]]; then
+		cp "${VNU_FILE}" "${CACHE_FILE}.$$" && mv -f "${CACHE_FILE}.$$" "${CACHE_FILE}"
+		cache_evict
+	fi
+fi
+
 while read line; do
 	((i++))
 	if echo "${line}" | grep -f "${IGNORE_FILE}" -q > /dev/null; then
@@ -60,7 +114,7 @@ while read line; do
 	end="${_end%%.*}"
 	sed -n ${begin},${end}p "${HTML_FILE}"
 	echo "--"
-done < <(java -jar "${VNU_JAR}" --errors-only --format gnu "${HTML_FILE}" 2>&1)
+done < "${VNU_FILE}"
 
 echo -e ">>> Found: ${C_WHITE}${i}${C_OFF} issue(s) Errors: ${C_RED}${err}${C_OFF} Ignored: ${C_YELLOW}${es_err}${C_OFF}" >&2
 echo ">>> Done." >&2
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""
+Danube Cloud API tests and other tools related to Danube Cloud testing and development.
+"""
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Task log analytics.
+
+Task log exports (es output of get /task/log, JSON lists or JSON lines; optionally gzipped) are read in bulk and
+reduced to one row per task. All task IDs are decoded in one regular expression pass (see _decode_task_ids()) into
+compact columns (arrays of small integer codes for user, task type and owner, float arrays for times). Throughput,
+duration percentiles and failure rates are then computed per user, task type and/or owner.
+"""
+
+import re
+import json
+from array import array
+
+from esdc_tests.common import DEFAULT_TASK_PREFIX, abort, red, cyan, _arg_list
+from esdc_tests.bench import _percentile
+from esdc_tests.tasklog import _entry_task_id, _entry_time, _parse_time
+
+# One match per line of joined task ID prefixes: user ID, task type, owner ID (see _task_prefix_from_task_id())
+RE_TASK_PREFIXES = re.compile(r'^(\d*)([a-zA-Z]*)(\d*).*$', re.M)
+TASK_ID_SUFFIX_LENGTH = 24
+
+STATUS_PENDING = 0
+STATUS_SUCCESS = 1
+STATUS_FAILURE = 2
+
+STATUSES = {
+    'SUCCESS': STATUS_SUCCESS,
+    'FAILURE': STATUS_FAILURE,
+    'REVOKED': STATUS_FAILURE,
+}
+
+GROUP_COLUMNS = ('user', 'type', 'owner')
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        import gzip
+        return gzip.open(path, 'rt')
+    return open(path)
+
+
+def _entries_from_doc(doc):
+    """Return list of task log entries from a parsed JSON document"""
+    if isinstance(doc, dict):
+        if 'text' in doc:  # es output
+            return _entries_from_doc(doc['text'])
+        if 'results' in doc:  # paginated response
+            return _entries_from_doc(doc['results'])
+        if _entry_task_id(doc):
+            return [doc]
+        return []
+
+    if isinstance(doc, list):
+        return [i for i in doc if isinstance(i, dict)]
+
+    return []
+
+
+def _read_entries(path):
+    """Generator of task log entries from a file with JSON documents (one per line or one per file)"""
+    with _open(path) as f:
+        first = f.read(1)
+        f.seek(0)
+
+        if first == '[':
+            for entry in _entries_from_doc(json.load(f)):
+                yield entry
+            return
+
+        for line in f:
+            line = line.strip()
+
+            if not line:
+                continue
+
+            try:
+                doc = json.loads(line)
+            except ValueError:
+                continue
+
+            for entry in _entries_from_doc(doc):
+                yield entry
+
+
+class TaskColumns(object):
+    """One row per task stored in columns. Categorical columns contain codes into the *_values lists"""
+    def __init__(self):
+        self.task_ids = []
+        self.start = array('d')
+        self.end = array('d')
+        self.status = array('b')
+        self.columns = {}
+        self.values = {}
+
+    def __len__(self):
+        return len(self.task_ids)
+
+    def set_categorical(self, name, raw_values):
+        """Store list of values as array of codes"""
+        codes = {}
+        values = []
+        column = array('I')
+
+        for value in raw_values:
+            code = codes.get(value)
+
+            if code is None:
+                code = codes[value] = len(values)
+                values.append(value)
+
+            column.append(code)
+
+        self.columns[name] = column
+        self.values[name] = values
+
+
+def _decode_task_ids(task_ids):
+    """Decode (user ID, task type, owner ID) of all task IDs in one pass"""
+    if not task_ids:
+        return [], [], []
+
+    prefixes = '\n'.join(tid[:-TASK_ID_SUFFIX_LENGTH] for tid in task_ids)
+    decoded = RE_TASK_PREFIXES.findall(prefixes)
+
+    if len(decoded) != len(task_ids):
+        abort(red('could not decode task IDs (%d decoded, %d expected)' % (len(decoded), len(task_ids))))
+
+    default_type, default_owner = DEFAULT_TASK_PREFIX[1], DEFAULT_TASK_PREFIX[2]
+
+    return ([d[0] for d in decoded],
+            [d[1] or default_type for d in decoded],
+            [d[2] or default_owner for d in decoded])
+
+
+def _ingest(paths):
+    """Reduce task log entries to one row per task"""
+    tasks = {}  # task_id -> [first time, last time, status]
+    entries = 0
+
+    for path in paths:
+        for entry in _read_entries(path):
+            task_id = _entry_task_id(entry)
+            ts = _parse_time(_entry_time(entry))
+
+            if not task_id or ts is None:
+                continue
+
+            entries += 1
+            status = STATUSES.get(str(entry.get('status', '')).upper(), STATUS_PENDING)
+            row = tasks.get(task_id)
+
+            if row is None:
+                tasks[task_id] = [ts, ts, status]
+            else:
+                if ts < row[0]:
+                    row[0] = ts
+                if ts >= row[1]:
+                    row[1] = ts
+                if status != STATUS_PENDING:
+                    row[2] = status
+
+    cols = TaskColumns()
+    cols.task_ids = list(tasks.keys())
+
+    for task_id in cols.task_ids:
+        start, end, status = tasks[task_id]
+        cols.start.append(start)
+        cols.end.append(end)
+        cols.status.append(status)
+
+    del tasks
+    users, types, owners = _decode_task_ids(cols.task_ids)
+    cols.set_categorical('user', users)
+    cols.set_categorical('type', types)
+    cols.set_categorical('owner', owners)
+
+    return cols, entries
+
+
+def _group_rows(cols, by):
+    """Return dict of group key (tuple of values) -> list of row indexes"""
+    groups = {}
+    columns = [cols.columns[name] for name in by]
+    values = [cols.values[name] for name in by]
+
+    for i in range(len(cols)):
+        key = tuple(v[c[i]] for c, v in zip(columns, values))
+        groups.setdefault(key, []).append(i)
+
+    return groups
+
+
+def _group_stats(cols, rows):
+    start, end, status = cols.start, cols.end, cols.status
+    done = [i for i in rows if status[i] != STATUS_PENDING]
+    durations = sorted(end[i] - start[i] for i in done)
+    failed = sum(1 for i in done if status[i] == STATUS_FAILURE)
+    first = min(start[i] for i in rows)
+    last = max(end[i] for i in rows)
+    minutes = max((last - first) / 60.0, 1.0 / 60)
+
+    return {
+        'tasks': len(rows),
+        'done': len(done),
+        'rate': len(rows) / minutes,
+        'p50': _percentile(durations, 50),
+        'p90': _percentile(durations, 90),
+        'p99': _percentile(durations, 99),
+        'failure': float(failed) / len(done) if done else 0.0,
+    }
+
+
+def _fmt(value):
+    return '%9s' % '-' if value is None else '%9.2f' % value
+
+
+def analytics(files='', by='type', top=30):
+    """task throughput, duration percentiles and failure rate per user/type/owner from task log exports"""
+    paths = _arg_list(files)
+    by = _arg_list(by)
+    top = int(top)
+
+    if not paths:
+        abort(red('missing task log export files (files=export1.json+export2.json.gz)'))
+
+    for name in by:
+        if name not in GROUP_COLUMNS:
+            abort(red('unknown column "%s" (allowed: %s)' % (name, ', '.join(GROUP_COLUMNS))))
+
+    cols, entries = _ingest(paths)
+
+    if not len(cols):
+        abort(red('no task log entries found'))
+
+    span = (max(cols.end) - min(cols.start)) / 60.0
+    print(cyan('*** %d task log entries, %d tasks, %.1f minutes ***' % (entries, len(cols), span)))
+    print('    %-30s %8s %8s %9s %9s %9s %9s %8s' % ('+'.join(by), 'tasks', 'done', 'tasks/min', 'p50 s', 'p90 s',
+                                                     'p99 s', 'failed'))
+    groups = sorted(_group_rows(cols, by).items(), key=lambda x: len(x[1]), reverse=True)
+
+    for key, rows in groups[:top]:
+        x = _group_stats(cols, rows)
+        line = '    %-30s %8d %8d %9.2f %s %s %s %7.1f%%' % ('/'.join(str(k) for k in key)[:30], x['tasks'], x['done'],
+                                                             x['rate'], _fmt(x['p50']), _fmt(x['p90']), _fmt(x['p99']),
+                                                             x['failure'] * 100)
+
+        if x['failure'] > 0:
+            line = red(line)
+
+        print(line)
+
+    if len(groups) > top:
+        print('    ... %d more groups' % (len(groups) - top))
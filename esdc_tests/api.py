@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Minimal Danube Cloud API HTTP client used by benchmarks, which need raw HTTP access (exact request rates, response
+headers and sizes) instead of running the es command.
+
+The es command line syntax (method and resource) is kept, e.g.: Api().es('get', '/vm', full=True).
+Uses a persistent HTTP(S) connection, so an Api instance must not be shared between threads.
+With retry_throttled=True, throttled (429) requests are repeated after the time from the Retry-After header.
+"""
+
+import os
+import json
+import time
+
+from esdc_tests.common import DC
+
+API_URL = os.environ.get('ES_API_URL', 'https://127.0.0.1/api')
+API_TIMEOUT = 30
+THROTTLED = 429
+
+METHODS = {
+    'get': 'GET',
+    'create': 'POST',
+    'set': 'PUT',
+    'delete': 'DELETE',
+}
+
+
+class ApiError(Exception):
+    pass
+
+
+class Response(object):
+    """HTTP response with timing information (in seconds)"""
+    __slots__ = ('status', 'headers', 'body', 'ttfb', 'duration')
+
+    def __init__(self, status, headers, body, ttfb, duration):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.ttfb = ttfb
+        self.duration = duration
+
+    def __repr__(self):
+        return '<Response status=%s size=%d duration=%.3f>' % (self.status, len(self.body), self.duration)
+
+    def header(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    @property
+    def text(self):
+        """Decoded response body (the same as "text" in es output)"""
+        body = self.body
+
+        if self.header('content-encoding') == 'gzip':
+            import gzip
+            body = gzip.decompress(body)
+
+        try:
+            return json.loads(body.decode('utf-8'))
+        except ValueError:
+            return body.decode('utf-8', 'replace')
+
+
+class Api(object):
+    """Danube Cloud API session"""
+    def __init__(self, url=API_URL, dc=DC, timeout=API_TIMEOUT, retry_throttled=False):
+        from urllib.parse import urlsplit
+
+        u = urlsplit(url)
+        self.url = url
+        self.scheme = u.scheme
+        self.host = u.netloc
+        self.prefix = u.path.rstrip('/')
+        self.dc = dc
+        self.timeout = timeout
+        self.retry_throttled = retry_throttled
+        self.token = None
+        self._conn = None
+
+    def _connect(self):
+        import http.client
+
+        if self.scheme == 'https':
+            import ssl
+            # noinspection PyProtectedMember
+            return http.client.HTTPSConnection(self.host, timeout=self.timeout,
+                                               context=ssl._create_unverified_context())
+        return http.client.HTTPConnection(self.host, timeout=self.timeout)
+
+    def close(self):
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+
+    def request(self, method, resource, params=None, headers=None, dc=True):
+        """Send HTTP request to API resource (e.g. /vm/status) and return Response"""
+        while True:
+            res = self._request(method, resource, params=params, headers=headers, dc=dc)
+
+            if res.status != THROTTLED or not self.retry_throttled:
+                return res
+
+            try:
+                time.sleep(float(res.header('retry-after', 1)))
+            except ValueError:
+                time.sleep(1)
+
+    def _request(self, method, resource, params=None, headers=None, dc=True):
+        from urllib.parse import urlencode
+
+        params = dict(params or {})
+        query = {}
+        path = '%s/%s/' % (self.prefix, resource.strip('/'))
+        hdrs = {'Accept': 'application/json'}
+        body = None
+
+        if dc and self.dc:
+            query['dc'] = self.dc
+
+        if self.token:
+            hdrs['Authorization'] = 'Token %s' % self.token
+
+        if method == 'GET':
+            query.update(params)
+        else:
+            body = json.dumps(params)
+            hdrs['Content-Type'] = 'application/json'
+
+        if query:
+            path += '?' + urlencode(query)
+
+        if headers:
+            hdrs.update(headers)
+
+        for attempt in (1, 2):  # Reconnect once if a kept-alive connection was closed by the server
+            if self._conn is None:
+                self._conn = self._connect()
+
+            start = time.time()
+
+            # noinspection PyBroadException
+            try:
+                self._conn.request(method, path, body=body, headers=hdrs)
+                res = self._conn.getresponse()
+                ttfb = time.time() - start
+                data = res.read()
+            except Exception as e:
+                self.close()
+
+                if attempt == 2:
+                    raise ApiError('%s %s failed: %s' % (method, path, e))
+                continue
+
+            if res.getheader('connection', '').lower() == 'close':
+                self.close()
+
+            return Response(res.status, dict((k.lower(), v) for k, v in res.getheaders()), data, ttfb,
+                            time.time() - start)
+
+    def es(self, method, resource, headers=None, **params):
+        """Same as es command, e.g. es('set', '/vm/test99.example.com/define', ram=1024)"""
+        return self.request(METHODS[method], resource, params=params, headers=headers)
+
+    def login(self, username, password):
+        res = self.request('POST', '/accounts/login', params={'username': username, 'password': password}, dc=False)
+
+        if res.status != 200:
+            raise ApiError('Login failed (status=%s): %s' % (res.status, res.text))
+
+        self.token = res.text['token']
+
+        return res
+
+    def logout(self):
+        res = self.request('GET', '/accounts/logout', dc=False)
+        self.token = None
+
+        return res
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Common benchmark helpers: timed es commands, latency statistics, concurrent execution and the latency report.
+"""
+
+import time
+from collections import defaultdict
+
+from esdc_tests.common import DC, STATUS_CODES_OK, cyan, red, _es_json
+
+
+def _percentile(values, p):
+    """Return p-th percentile (0-100) of a sorted list using linear interpolation"""
+    if not values:
+        return None
+
+    k = (len(values) - 1) * p / 100.0
+    f = int(k)
+    c = min(f + 1, len(values) - 1)
+
+    return values[f] + (values[c] - values[f]) * (k - f)
+
+
+def _timed_es_json(cmd, dc=DC):
+    """Run es command and return (status, text, duration in seconds)"""
+    start = time.time()
+    status, text = _es_json(cmd, dc=dc)
+
+    return status, text, time.time() - start
+
+
+class LatencyStats(object):
+    """Latency samples (in seconds) and response status counters of one request type"""
+    def __init__(self, name):
+        self.name = name
+        self.samples = []
+        self.statuses = defaultdict(int)
+
+    def add(self, duration, status=200):
+        self.samples.append(duration)
+        self.statuses[status] += 1
+
+    @property
+    def count(self):
+        return len(self.samples)
+
+    @property
+    def errors(self):
+        return sum(n for status, n in self.statuses.items() if status not in STATUS_CODES_OK)
+
+    def percentile(self, p):
+        return _percentile(sorted(self.samples), p)
+
+    def summary(self):
+        values = sorted(self.samples)
+
+        if not values:
+            return {'name': self.name, 'count': 0, 'errors': 0}
+
+        return {
+            'name': self.name,
+            'count': len(values),
+            'errors': self.errors,
+            'min': values[0],
+            'mean': sum(values) / len(values),
+            'p50': _percentile(values, 50),
+            'p90': _percentile(values, 90),
+            'p99': _percentile(values, 99),
+            'max': values[-1],
+            'statuses': dict(self.statuses),
+        }
+
+
+REPORT_HEADER = '    %-40s %6s %6s %9s %9s %9s %9s %9s' % ('name', 'count', 'errors', 'min', 'p50', 'p90', 'p99', 'max')
+REPORT_ROW = '    %-40s %6d %6d %9.3f %9.3f %9.3f %9.3f %9.3f'
+
+
+def _print_latency_report(title, stats):
+    """Print latency report (in seconds) for a list of LatencyStats objects"""
+    print(cyan('\n*** %s ***' % title))
+    print(REPORT_HEADER)
+
+    for s in stats:
+        x = s.summary()
+
+        if not x['count']:
+            print('    %-40s %6d' % (s.name, 0))
+            continue
+
+        line = REPORT_ROW % (x['name'][:40], x['count'], x['errors'], x['min'], x['p50'], x['p90'], x['p99'], x['max'])
+
+        if x['errors']:
+            line = red(line)
+
+        print(line)
+
+    print('')
+
+
+def _run_concurrent(jobs, workers):
+    """Run list of callables in a thread pool and return their results in the same order"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(job) for job in jobs]
+
+        return [f.result() for f in futures]
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+Task callback delivery latency harness.
+
+A local HTTP server receives API task callbacks. Every submitted task gets its own callback URL with a random token
+(cb_url=http://<host>:<port>/cb/<token>), so callbacks are correlated with tasks without relying on the payload.
+For every task the harness records the time of submission, completion (first poll of /task/<task_id>/status with
+a final status) and callback arrival. Tasks are submitted one by one (single) and concurrently (bulk).
+
+Callbacks are sent on behalf of the user who submitted the task. With callback_key=..., tasks are submitted by
+a temporary user (estest-callback) created with this callback key and deleted after the test; the API never returns
+callback keys, so the key of an existing user could not be restored. The user must get access to the DC and to the
+task command through its groups (groups=group1+group2). The receiver must be reachable from the management
+server - the local address used for connections to the API is used by default (host argument).
+"""
+
+import time
+import uuid
+import threading
+
+from esdc_tests.common import DC, ADMIN_USERNAME, ADMIN_PASSWORD, STATUS_CODES_OK, abort, red, yellow, cyan, _arg_list
+from esdc_tests.bench import LatencyStats, _print_latency_report, _run_concurrent
+from esdc_tests.api import API_URL, Api, ApiError
+
+DEFAULT_CMD = 'set /node/%s/sysinfo'
+DEFAULT_NODE = 'headnode.dev.erigones.com'
+DONE_STATUSES = ('SUCCESS', 'FAILURE', 'REVOKED')
+CB_USERNAME = 'estest-callback'
+
+
+class _Task(object):
+    """One submitted task with timestamps (unix time)"""
+    __slots__ = ('token', 'task_id', 'status', 'submitted', 'accepted', 'done', 'callback', 'cb_method', 'signed')
+
+    def __init__(self):
+        self.token = uuid.uuid4().hex
+        self.task_id = None
+        self.status = None
+        self.submitted = self.accepted = self.done = self.callback = None
+        self.cb_method = None
+        self.signed = False
+
+
+class _Receiver(object):
+    """HTTP server recording callbacks of registered tasks in a background thread"""
+    def __init__(self, bind, port):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.tasks = {}
+        self.unknown = 0
+        self.lock = threading.Lock()
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _callback(self):
+                now = time.time()
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length).decode('utf-8', 'replace') if length else ''
+                token = self.path.split('?')[0].rstrip('/').rsplit('/', 1)[-1]
+                signed = 'signature' in (self.path + body).lower() or \
+                    any('signature' in k.lower() for k in self.headers.keys())
+
+                with receiver.lock:
+                    task = receiver.tasks.get(token)
+
+                    if task is None:
+                        receiver.unknown += 1
+                    elif task.callback is None:
+                        task.callback = now
+                        task.cb_method = self.command
+                        task.signed = signed
+
+                self.send_response(200 if task else 404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            do_GET = do_POST = do_PUT = do_DELETE = _callback
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((bind, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        thread = threading.Thread(target=self.server.serve_forever, name='callbacks')
+        thread.daemon = True
+        thread.start()
+
+    def register(self, task):
+        with self.lock:
+            self.tasks[task.token] = task
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _create_user(api, username, password, callback_key, groups):
+    """Create temporary API user with a callback key (the same way as the accounts test suite)"""
+    params = {'password': password, 'first_name': 'Callback', 'last_name': 'Tester', 'api_access': True,
+              'email': '%s@example.com' % username, 'callback_key': callback_key}
+
+    if groups:
+        params['groups'] = groups
+
+    try:
+        res = api.es('create', '/accounts/user/%s' % username, **params)
+    except ApiError as e:
+        return abort(red(str(e)))
+
+    if res.status not in STATUS_CODES_OK:
+        abort(red('could not create user %s (status=%s): %s' % (username, res.status, res.text)))
+
+
+def _delete_user(api, username):
+    try:
+        res = api.es('delete', '/accounts/user/%s' % username)
+        error = None if res.status in STATUS_CODES_OK else 'status=%s: %s' % (res.status, res.text)
+    except ApiError as e:
+        error = str(e)
+
+    if error:
+        print(red('Could not delete user %s (%s)' % (username, error)))
+
+
+def _local_address(api_url):
+    """Return local IP address used for connections to the API server"""
+    import socket
+    from urllib.parse import urlsplit
+
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    try:
+        s.connect((urlsplit(api_url).hostname, 9))
+        return s.getsockname()[0]
+    except (socket.error, TypeError):
+        return '127.0.0.1'
+    finally:
+        s.close()
+
+
+class _Client(object):
+    """Submits tasks; every thread uses its own API connection with a shared token"""
+    def __init__(self, master, cmd, cb_base, cb_method, receiver):
+        self.master = master
+        self.method, self.resource = cmd.split(None, 1)
+        self.cb_base = cb_base
+        self.cb_method = cb_method
+        self.receiver = receiver
+        self._local = threading.local()
+
+    def _api(self):
+        api = getattr(self._local, 'api', None)
+
+        if api is None:
+            api = self._local.api = Api(url=self.master.url, dc=self.master.dc)
+            api.token = self.master.token
+
+        return api
+
+    def submit(self, task):
+        self.receiver.register(task)
+        task.submitted = time.time()
+
+        try:
+            res = self._api().es(self.method, self.resource, cb_url=self.cb_base + task.token,
+                                 cb_method=self.cb_method)
+        except ApiError as e:
+            task.status = str(e)
+            return
+
+        task.accepted = time.time()
+        text = res.text
+
+        if res.status in STATUS_CODES_OK and isinstance(text, dict) and text.get('task_id'):
+            task.task_id = text['task_id']
+        else:
+            task.status = res.status
+            print(red('    task submission failed (status=%s): %s' % (res.status, text)))
+
+
+def _wait(api, receiver, tasks, poll, timeout):
+    """Poll task status until all tasks are done and all callbacks arrived (or timeout)"""
+    deadline = time.time() + timeout
+    submitted = [t for t in tasks if t.task_id]
+
+    while time.time() < deadline:
+        not_done = [t for t in submitted if t.done is None]
+
+        if poll:
+            for t in not_done:
+                try:
+                    res = api.es('get', '/task/%s/status' % t.task_id)
+                except ApiError:
+                    continue
+
+                status = res.text.get('status') if isinstance(res.text, dict) else None
+
+                if status in DONE_STATUSES:
+                    t.done = time.time()
+                    t.status = status
+
+        with receiver.lock:
+            waiting = [t for t in submitted if t.callback is None]
+
+        if not waiting and (not poll or not not_done):
+            break
+
+        time.sleep(poll or 0.1)
+
+
+def _stats(name, tasks):
+    submit = LatencyStats('%s: submit' % name)
+    done = LatencyStats('%s: completion' % name)
+    callback = LatencyStats('%s: callback' % name)
+    delivery = LatencyStats('%s: callback after completion' % name)
+
+    for t in tasks:
+        if not t.task_id:
+            submit.add(time.time() - t.submitted if t.accepted is None else t.accepted - t.submitted, t.status)
+            continue
+
+        submit.add(t.accepted - t.submitted)
+
+        if t.done:
+            done.add(t.done - t.submitted, 200 if t.status == 'SUCCESS' else t.status)
+
+        if t.callback:
+            callback.add(t.callback - t.submitted)
+
+            if t.done:
+                delivery.add(max(t.callback - t.done, 0))
+
+    return [submit, done, callback, delivery]
+
+
+def _print_summary(name, tasks, unknown):
+    submitted = [t for t in tasks if t.task_id]
+    arrived = [t for t in submitted if t.callback]
+    line = '    %s: %d tasks submitted, %d callbacks received, %d signed' % (name, len(submitted), len(arrived),
+                                                                          sum(1 for t in arrived if t.signed))
+
+    if len(arrived) > 1:
+        wall = max(t.callback for t in arrived) - min(t.submitted for t in submitted)
+        line += ', %.2f callbacks/s' % (len(arrived) / wall)
+
+    if len(arrived) < len(submitted):
+        line = red(line + ' - %d callbacks missing' % (len(submitted) - len(arrived)))
+
+    print(line)
+
+    if unknown:
+        print(yellow('    %d callbacks with unknown token' % unknown))
+
+
+def callback(single=5, bulk=20, workers=10, cmd=DEFAULT_CMD, node=DEFAULT_NODE, cb_method='POST', host='', port=0,
+             bind='0.0.0.0', poll=0.5, timeout=300, callback_key='', groups='', username=ADMIN_USERNAME,
+             password=ADMIN_PASSWORD, dc=DC):
+    """measure task completion and callback delivery latency for single and bulk tasks (cb_url registered per task)"""
+    single, bulk, workers, port = int(single), int(bulk), int(workers), int(port)
+    poll, timeout = float(poll), float(timeout)
+
+    if '%s' in cmd:
+        cmd %= node
+
+    admin = Api(dc=dc, retry_throttled=True)
+
+    try:
+        admin.login(username, password)
+    except ApiError as e:
+        abort(red(str(e)))
+
+    receiver = _Receiver(bind, port)
+    api = admin
+    test_user = None
+    stats = []
+
+    try:
+        if callback_key:
+            test_user = CB_USERNAME
+            test_password = uuid.uuid4().hex
+            print(cyan('*** Creating user %s with callback_key ***' % test_user))
+            _create_user(admin, test_user, test_password, callback_key, _arg_list(groups))
+            api = Api(dc=dc)
+
+            try:
+                api.login(test_user, test_password)
+            except ApiError as e:
+                abort(red(str(e)))
+
+        cb_base = 'http://%s:%d/cb/' % (host or _local_address(API_URL), receiver.port)
+        client = _Client(api, cmd, cb_base, cb_method, receiver)
+        print(cyan('*** Callback receiver at %s (%s) ***' % (cb_base, cmd)))
+
+        if single:
+            print(cyan('*** %d single tasks ***' % single))
+            tasks = []
+
+            for _ in range(single):
+                task = _Task()
+                client.submit(task)
+                _wait(api, receiver, [task], poll, timeout)
+                tasks.append(task)
+
+            _print_summary('single', tasks, 0)
+            stats.extend(_stats('single', tasks))
+
+        if bulk:
+            print(cyan('*** %d concurrent tasks (%d workers) ***' % (bulk, workers)))
+            tasks = [_Task() for _ in range(bulk)]
+
+            def job(task):
+                return lambda: client.submit(task)
+
+            _run_concurrent([job(t) for t in tasks], workers)
+            _wait(api, receiver, tasks, poll, timeout)
+            _print_summary('bulk', tasks, receiver.unknown)
+            stats.extend(_stats('bulk', tasks))
+    finally:
+        receiver.shutdown()
+
+        if test_user:
+            _delete_user(admin, test_user)
+
+    _print_latency_report('Task callback latency (seconds from submission)', stats)
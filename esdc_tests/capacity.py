@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Node capacity model (requires numpy).
+
+Nodes and VMs are loaded into numpy arrays (from fixtures, from the API or generated synthetically) and all node
+resources are computed in one batched computation:
+
+    cpu_free = int(cpu * cpu_coef) - sum of VM vCPUs on the node
+    ram_free = int(ram * ram_coef) - sum of VM RAM on the node
+
+KVM VMs use vcpus and ram, zones use cpu_cap / 100 and max_physical_memory. The expected values are compared with the
+cpu_free and ram_free numbers stored in fixtures or returned by the API (every node is counted as one test). Node
+resources are shared by all virtual DCs, so VMs of all DCs (get /dc) are summed unless dcs=dc1+dc2 is given.
+
+Placement feasibility (place=count:vcpus:ram) computes how many VMs of the given size fit into the free resources
+of all nodes.
+"""
+
+import os
+import json
+import time
+
+from esdc_tests import common
+from esdc_tests.common import BASE_DIR, DC, abort, red, cyan, _es_json, _arg_list, _arg_bool
+
+FIXTURES_DIR = os.path.join(BASE_DIR, 'fixtures')
+DEFAULT_FIXTURES = 'ce/headnode.json+ce/node02.json'
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        return abort(red('numpy is required by this task (pip install numpy)'))
+
+    return numpy
+
+
+def _vm_resources(vm_json):
+    """Return (vcpus, ram) used by a VM from its (decoded) json"""
+    if vm_json.get('brand') == 'kvm':
+        return vm_json.get('vcpus') or 0, vm_json.get('ram') or 0
+
+    return (vm_json.get('cpu_cap') or 0) / 100.0, vm_json.get('max_physical_memory') or 0
+
+
+class CapacityModel(object):
+    """Nodes and VMs stored in numpy arrays. VMs reference nodes by index (vm_node)"""
+    def __init__(self, hostnames, cpu, ram, cpu_coef, ram_coef, cpu_free, ram_free, vm_node, vm_cpu, vm_ram):
+        np = _numpy()
+        self.hostnames = hostnames
+        self.cpu = np.asarray(cpu, dtype=np.float64)
+        self.ram = np.asarray(ram, dtype=np.float64)
+        self.cpu_coef = np.asarray(cpu_coef, dtype=np.float64)
+        self.ram_coef = np.asarray(ram_coef, dtype=np.float64)
+        self.cpu_free = np.asarray(cpu_free, dtype=np.float64)
+        self.ram_free = np.asarray(ram_free, dtype=np.float64)
+        self.vm_node = np.asarray(vm_node, dtype=np.int64)
+        self.vm_cpu = np.asarray(vm_cpu, dtype=np.float64)
+        self.vm_ram = np.asarray(vm_ram, dtype=np.float64)
+
+    @property
+    def nodes(self):
+        return len(self.hostnames)
+
+    @property
+    def vms(self):
+        return len(self.vm_node)
+
+    def expected_free(self):
+        """Return (cpu_free, ram_free) arrays computed from node sizes and VMs"""
+        np = _numpy()
+        cpu_used = np.bincount(self.vm_node, weights=self.vm_cpu, minlength=self.nodes)
+        ram_used = np.bincount(self.vm_node, weights=self.vm_ram, minlength=self.nodes)
+
+        return (np.floor(self.cpu * self.cpu_coef) - cpu_used,
+                np.floor(self.ram * self.ram_coef) - ram_used)
+
+    def mismatches(self):
+        """Return indexes of nodes with reported free resources different from expected, and expected values"""
+        np = _numpy()
+        cpu_free, ram_free = self.expected_free()
+        bad = np.flatnonzero((np.abs(cpu_free - self.cpu_free) > 0.01) | (np.abs(ram_free - self.ram_free) > 0.01))
+
+        return bad, cpu_free, ram_free
+
+    def slots(self, vcpus, ram):
+        """Return number of VMs with the same size which fit into free resources of every node"""
+        np = _numpy()
+        cpu_free, ram_free = self.expected_free()
+        slots = np.minimum(np.floor(cpu_free / vcpus), np.floor(ram_free / ram))
+
+        return np.maximum(slots, 0).astype(np.int64)
+
+
+def _load_fixtures(paths):
+    import base64
+    import pickle
+
+    nodes = {}  # pk -> node fields
+    vms = []
+
+    for path in paths:
+        with open(os.path.join(FIXTURES_DIR, path)) as f:
+            objects = json.load(f)
+
+        for obj in objects:
+            if obj['model'] == 'vms.node':
+                nodes[obj['pk']] = obj['fields']
+            elif obj['model'] == 'vms.vm' and obj['fields'].get('node'):
+                vm_json = pickle.loads(base64.b64decode(obj['fields']['enc_json']), encoding='latin1')
+                vms.append((obj['fields']['node'], _vm_resources(vm_json)))
+
+    index = dict((pk, i) for i, pk in enumerate(nodes))
+    fields = list(nodes.values())
+    vms = [(index[node], res) for node, res in vms if node in index]
+
+    return CapacityModel([n['hostname'] for n in fields],
+                         [n['cpu'] for n in fields], [n['ram'] for n in fields],
+                         [float(n['cpu_coef']) for n in fields], [float(n['ram_coef']) for n in fields],
+                         [n['cpu_free'] for n in fields], [n['ram_free'] for n in fields],
+                         [i for i, _ in vms], [res[0] for _, res in vms], [res[1] for _, res in vms])
+
+
+def _api_list(cmd, dc=DC):
+    status, text = _es_json(cmd, dc=dc)
+
+    if status != 200:
+        abort(red('%s failed (status=%s): %s' % (cmd, status, text)))
+
+    return text['result']
+
+
+def _load_api(dcs):
+    """Build capacity model from node and VM definitions returned by the API (VMs of all DCs by default)"""
+    if not dcs:  # Node resources are shared by VMs of all virtual DCs
+        dcs = _api_list('get /dc', dc=None)
+
+    nodes = dict((n['hostname'], n) for n in _api_list('get /node -full', dc=None))
+
+    for node in _api_list('get /node/define -full', dc=None):
+        nodes.get(node['hostname'], {}).update((k, v) for k, v in node.items() if k.endswith('_coef'))
+
+    hostnames = list(nodes)
+    index = dict((hostname, i) for i, hostname in enumerate(hostnames))
+    vms = {}
+
+    for dc in dcs:
+        for vm in _api_list('get /vm/define -full', dc=dc):
+            if vm.get('node') in index:
+                vms[vm['hostname']] = (index[vm['node']], vm.get('vcpus') or 0, vm.get('ram') or 0)
+
+    fields = [nodes[h] for h in hostnames]
+    vms = list(vms.values())
+
+    try:
+        return CapacityModel(hostnames, [n['cpu'] for n in fields], [n['ram'] for n in fields],
+                             [float(n.get('cpu_coef', 1)) for n in fields],
+                             [float(n.get('ram_coef', 1)) for n in fields],
+                             [n['cpu_free'] for n in fields], [n['ram_free'] for n in fields],
+                             [x[0] for x in vms], [x[1] for x in vms], [x[2] for x in vms])
+    except KeyError as e:
+        abort(red('node resource %s not returned by the API' % e))
+
+
+def _synthetic(nodes, vms, errors, seed):
+    """Generate random nodes and VMs. Reported free resources are correct except for the number of errors"""
+    np = _numpy()
+    rng = np.random.RandomState(seed)
+    cpu = rng.choice([16, 32, 48, 64, 128], nodes)
+    ram = rng.choice([32768, 65536, 131072, 262144, 524288], nodes)
+    cpu_coef = rng.choice([1.0, 1.5, 2.0], nodes)
+    ram_coef = rng.choice([1.0, 0.9], nodes)
+    vm_node = rng.randint(0, nodes, vms)
+    vm_cpu = rng.choice([1, 2, 4, 8], vms)
+    vm_ram = rng.choice([512, 1024, 2048, 4096, 8192], vms)
+    model = CapacityModel(['node%05d.synthetic' % i for i in range(nodes)], cpu, ram, cpu_coef, ram_coef,
+                          np.zeros(nodes), np.zeros(nodes), vm_node, vm_cpu, vm_ram)
+    model.cpu_free, model.ram_free = model.expected_free()
+
+    if errors:
+        model.ram_free[rng.choice(nodes, min(errors, nodes), replace=False)] -= 1
+
+    return model
+
+
+def _check(model, title):
+    start = time.time()
+    bad, cpu_free, ram_free = model.mismatches()
+    elapsed = time.time() - start
+
+    print(cyan('*** %s: %d nodes, %d VMs checked in %.1f ms ***' % (title, model.nodes, model.vms, elapsed * 1000)))
+    common.TESTS_RUN += model.nodes
+    common.TESTS_FAIL += len(bad)
+
+    for i in bad[:20]:
+        print(red('    %-30s cpu_free=%g (expected %g) ram_free=%g (expected %g)' % (
+            model.hostnames[i], model.cpu_free[i], cpu_free[i], model.ram_free[i], ram_free[i])))
+
+    if len(bad) > 20:
+        print(red('    ... %d more nodes' % (len(bad) - 20)))
+
+
+def _check_placement(model, place):
+    np = _numpy()
+
+    for item in _arg_list(place):
+        try:
+            count, vcpus, ram = (int(i) for i in item.split(':'))
+        except ValueError:
+            abort(red('invalid placement "%s" (expected count:vcpus:ram)' % item))
+
+        start = time.time()
+        slots = model.slots(vcpus, ram)
+        elapsed = time.time() - start
+        total = int(slots.sum())
+        line = '    %d x (%d vCPU, %d MB): %d slots on %d nodes (%.1f ms)' % (count, vcpus, ram, total,
+                                                                          int(np.count_nonzero(slots)),
+                                                                          elapsed * 1000)
+        common.TESTS_RUN += 1
+
+        if total < count:
+            common.TESTS_FAIL += 1
+            line = red(line + ' - not enough capacity')
+
+        print(line)
+
+
+def capacity(fixtures=DEFAULT_FIXTURES, api=False, dcs='', nodes=0, vms=0, errors=0, place='', seed=None):
+    """check node free resources in fixtures, API (api=true) or synthetic data (nodes=N,vms=M) with numpy"""
+    nodes, vms, errors = int(nodes), int(vms), int(errors)
+    seed = None if seed is None else int(seed)
+
+    if nodes:
+        title, model = 'Synthetic data', _synthetic(nodes, vms, errors, seed)
+    elif _arg_bool(api):
+        common.ECHO_COMMANDS = False
+        title, model = 'API', _load_api(_arg_list(dcs))
+    else:
+        title, model = 'Fixtures', _load_fixtures(_arg_list(fixtures))
+
+    _check(model, title)
+
+    if place:
+        _check_placement(model, place)
+
+    common._summary()
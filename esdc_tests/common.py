@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+Shared test harness helpers: running the es command, comparing results, counters and terminal output.
+
+This module is imported on every run, so it must stay cheap to import. Heavier standard library modules (e.g.
+subprocess) are imported lazily inside the functions that need them.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+
+###############################################################################
+# globals
+###############################################################################
+
+DEBUG = False
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+ERIGONES_HOME = os.environ.get('ERIGONES_HOME', '/opt/erigones')
+ES = os.path.join(ERIGONES_HOME, 'bin', 'es')
+CTL_SH = os.path.join(ERIGONES_HOME, 'bin', 'ctl.sh')
+STATUS_CODES_OK = (200, 201)
+
+# Test target - can be changed for every estest process (see the fanout task)
+DC = os.environ.get('ESTEST_DC', 'main')
+SESSION_FILE = os.environ.get('ES_SESSION_FILE', '/tmp/esdc.session')  # Token store of the es command
+ADMIN_USERNAME = os.environ.get('ESTEST_USERNAME', 'admin')
+ADMIN_PASSWORD = os.environ.get('ESTEST_PASSWORD', 'changeme')
+REPORT_FILE = os.environ.get('ESTEST_REPORT', '')  # Test results are saved into this JSON file at the end of a run
+
+TESTS_RUN = 0
+TESTS_FAIL = 0
+TESTS_WARN = 0
+TEST_RESULTS = []  # (test name, result, duration); collected only if REPORT_FILE is set
+
+RE_TASK_PREFIX = re.compile(r'([a-zA-Z]+)')
+DEFAULT_TASK_PREFIX = [None, 'e', '1', 'd', '1']
+
+THROTTLE_PROFILE = os.environ.get('ESTEST_THROTTLE_PROFILE', os.path.expanduser('~/.esdc_throttle.json'))
+
+ECHO_COMMANDS = True  # Print every local command before running it (same as Fabric did)
+VERBOSE = True  # Print also successful tests
+
+###############################################################################
+# terminal output
+###############################################################################
+
+
+def _wrap_with(code):
+    def inner(text, bold=False):
+        c = code
+        if bold:
+            c = '1;%s' % c
+        return '\033[%sm%s\033[0m' % (c, text)
+    return inner
+
+
+red = _wrap_with('31')
+green = _wrap_with('32')
+yellow = _wrap_with('33')
+cyan = _wrap_with('36')
+
+
+def abort(msg):
+    """Print fatal error message and exit with return code 1"""
+    sys.stderr.write('\nFatal error: %s\n\nAborting.\n' % msg)
+    sys.exit(1)
+
+
+class LocalResult(str):
+    """Captured stdout of a local command with return_code and stderr attributes"""
+    return_code = None
+    stderr = ''
+
+    @property
+    def succeeded(self):
+        return self.return_code == 0
+
+    @property
+    def failed(self):
+        return not self.succeeded
+
+
+def local(command, capture=True):
+    """Run command in a local shell and return its (stripped) output as LocalResult"""
+    import subprocess
+
+    if ECHO_COMMANDS:
+        print('[localhost] local: %s' % command)
+
+    if capture:
+        out_stream = err_stream = subprocess.PIPE
+    else:
+        out_stream = err_stream = None
+
+    p = subprocess.Popen(command, shell=True, stdout=out_stream, stderr=err_stream)
+    stdout, stderr = p.communicate()
+
+    if stdout is None:
+        stdout = ''
+    else:
+        stdout = stdout.decode('utf-8', 'replace').strip()
+
+    if stderr is None:
+        stderr = ''
+    else:
+        stderr = stderr.decode('utf-8', 'replace').strip()
+
+    res = LocalResult(stdout)
+    res.return_code = p.returncode
+    res.stderr = stderr
+
+    return res
+
+
+###############################################################################
+# helpers
+###############################################################################
+
+def _ctl_shell(code):
+    """Run python code in the Danube Cloud Django shell (on the management server only) and return LocalResult"""
+    res = local('%s shell -c "%s"' % (CTL_SH, code))
+
+    if res.failed:
+        print(yellow(res.stderr))
+
+    return res
+
+
+def _es(*argv):
+    if not os.path.exists(ES):
+        sys.stderr.write('ERROR: %s does not exist\n' % ES)
+        sys.exit(100)
+
+    return local(ES + ' ' + ' '.join(argv), capture=True)
+
+
+def _es_json(cmd, dc=DC):
+    """Run es command and return (status, text) tuple from its output. Status is None if output is not parsed"""
+    if dc:
+        cmd += ' -dc %s' % dc
+
+    out = _es(cmd)
+
+    try:
+        jout = json.loads(out)
+        return jout['status'], jout['text']
+    except (ValueError, TypeError, KeyError):
+        return None, out
+
+
+def _exp_compare(exp, text, equal=False):
+    if isinstance(exp, dict):
+        for i in exp.keys():
+            if not _exp_compare(exp[i], text[i], True):
+                return False
+    elif isinstance(exp, (list, tuple)):
+        for i in range(len(exp)):
+            if not _exp_compare(exp[i], text[i], True):
+                return False
+    elif equal:
+        if exp != text:
+            return False
+    else:
+        if exp not in text:
+            return False
+
+    return True
+
+
+def _test(cmd, exp, scode=200, rc=0, custom_test=None, dc=DC):
+    # noinspection PyProtectedMember
+    caller = sys._getframe(1).f_code.co_name
+    global TESTS_RUN
+    TESTS_RUN += 1
+
+    def log_fail(res, s=''):
+        global TESTS_FAIL
+        TESTS_FAIL += 1
+        print(red('Test %s failed: %s' % (caller, s)))
+        print(res)
+
+    # noinspection PyUnusedLocal
+    def log_warn(res, s=''):
+        global TESTS_WARN
+        TESTS_WARN += 1
+        print(yellow('Test %s warning: %s' % (caller, s)))
+        print(res)
+
+    def log_ok(s=''):
+        if VERBOSE:
+            print(green('Test %s succeeded %s' % (caller, s)))
+
+    if dc:
+        cmd += ' -dc %s' % dc
+
+    ret = False
+    start = time.time()
+    out = _es(cmd)
+    duration = time.time() - start
+
+    if out.return_code != rc:
+        log_fail(out, 'return_code='+str(out.return_code))
+    else:
+        # noinspection PyBroadException
+        try:
+            jout = json.loads(out)
+        except:
+            log_fail(out, 'json not parsed')
+        else:
+            try:
+                if jout['status'] != scode:
+                    raise ValueError('status code mismatch')
+            except Exception as e:
+                log_fail(out, str(e))
+            else:
+                text = jout['text']
+                try:
+                    if not _exp_compare(exp, text):
+                        raise Exception('test structure not found')
+                except Exception as e:
+                    log_fail(out, str(e))
+                else:
+                    if custom_test:
+                        try:
+                            if custom_test(text):
+                                log_ok()
+                                ret = True
+                            else:
+                                log_fail(out, 'custom test failed')
+                        except Exception as e:
+                            log_fail(out, 'custom test got exception: ' + str(e))
+                    else:
+                        log_ok()
+                        ret = True
+
+    if REPORT_FILE:  # Long soak runs would keep all results in memory otherwise
+        TEST_RESULTS.append((caller, ret, duration))
+
+    return ret
+
+
+def _summary():
+    print('''
+
+*** Test summary ***
+    Total:      %s
+    Failed:     %s
+    Warning:    %s
+    Successful: %s
+''' % (TESTS_RUN, red(TESTS_FAIL), yellow(TESTS_WARN), green(TESTS_RUN-(TESTS_FAIL+TESTS_WARN))))
+
+    raise SystemExit(TESTS_FAIL)
+
+
+def _save_report(path):
+    """Save test counters and results into a JSON file (read by the fanout task)"""
+    report = {
+        'dc': DC,
+        'es': ES,
+        'run': TESTS_RUN,
+        'failed': TESTS_FAIL,
+        'warnings': TESTS_WARN,
+        'tests': [{'name': name, 'ok': ok, 'duration': duration} for name, ok, duration in TEST_RESULTS],
+    }
+
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=4)
+
+
+def _remove_token_store():
+    # noinspection PyBroadException
+    try:
+        os.remove(SESSION_FILE)
+    except:
+        pass
+
+
+def _sleep(seconds):
+    print(cyan('\n***\n* Taking a %s seconds break to avoid API throttling.\n***' % (seconds,)))
+    i = 0
+    while i < seconds:
+        sys.stdout.write('.')
+        sys.stdout.flush()
+        time.sleep(1)
+        i += 1
+    print('\n')
+
+
+def _arg_list(value):
+    """Convert task argument to list. Items can be separated by "+" (a comma would separate task arguments)"""
+    if isinstance(value, (list, tuple)):
+        return list(value)
+
+    return [i for i in re.split(r'[+,]', value) if i]
+
+
+def _arg_bool(value):
+    """Convert task argument to bool"""
+    if isinstance(value, bool):
+        return value
+
+    return value.lower() not in ('false', '0', 'no', 'off', '')
+
+
+def _throttle_profile(path=None):
+    """Load API throttling limits saved by the throttle task. Return empty dict if not available"""
+    try:
+        with open(path or THROTTLE_PROFILE) as f:
+            return json.load(f).get('classes', {})
+    except (IOError, ValueError):
+        return {}
+
+
+def _throttle_pause(endpoint_class, default):
+    """Seconds needed for the request budget of an endpoint class to recover fully (default if not known)"""
+    limits = _throttle_profile().get(endpoint_class)
+
+    if not limits or not limits.get('window'):
+        return default
+
+    return int(limits['window']) + 1
+
+
+def _task_prefix_from_task_id(task_id):
+    """Get (user ID, task type, owner ID) tuple from task ID"""
+    tp = RE_TASK_PREFIX.split(task_id[:-24])
+    return tuple(tp + DEFAULT_TASK_PREFIX[len(tp):])
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Concurrent modification benchmark for the VM define endpoints.
+
+The same mix of define, disk and NIC updates is sent serially (baseline), concurrently to one VM and concurrently to
+disjoint VMs. Comparing latency inflation of the scenarios shows whether define updates are serialised per VM or
+cluster-wide. After the same-VM scenario the final VM definition is checked against the successful writes.
+"""
+
+import time
+import threading
+
+from esdc_tests import common
+from esdc_tests.common import DC, ADMIN_USERNAME, ADMIN_PASSWORD, STATUS_CODES_OK, abort, red, green, yellow, cyan, \
+    _es_json
+from esdc_tests.bench import LatencyStats, _percentile, _timed_es_json, _print_latency_report, _run_concurrent
+
+HOSTNAME = 'contention%02d.example.com'
+CONFLICT_CODES = (409, 423)
+SERIALISED_INFLATION = 1.5  # p50 latency ratio (concurrent vs. serial) considered as serialisation
+
+# op name -> (command template, field name used for the final state check, value generator)
+OPS = (
+    ('define', 'set /vm/%s/define -ram %d', 'ram', lambda i: 256 + 32 * i),
+    ('disk', 'set /vm/%s/define/disk/1 -size %d', 'size', lambda i: 10240 + 1024 * i),
+    ('nic', 'set /vm/%s/define/nic/1 -model %s', 'model', lambda i: ('virtio', 'e1000', 'rtl8139')[i % 3]),
+)
+
+GET_CMDS = {
+    'define': 'get /vm/%s/define',
+    'disk': 'get /vm/%s/define/disk/1',
+    'nic': 'get /vm/%s/define/nic/1',
+}
+
+
+class Write(object):
+    """One timed define update"""
+    __slots__ = ('op', 'host', 'value', 'status', 'start', 'end')
+
+    def __init__(self, op, host, value):
+        self.op = op
+        self.host = host
+        self.value = value
+        self.status = None
+        self.start = self.end = None
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    @property
+    def ok(self):
+        return self.status in STATUS_CODES_OK
+
+
+def _define_vm(host, net, dc):
+    cmds = (
+        'create /vm/%s/define -alias %s -vcpus 1 -ram 256 -ostype 1' % (host, host.split('.')[0]),
+        'create /vm/%s/define/disk/1 -size 10240' % host,
+        'create /vm/%s/define/nic/1 -net %s' % (host, net),
+    )
+
+    for cmd in cmds:
+        status, text = _es_json(cmd, dc=dc)
+
+        if status not in STATUS_CODES_OK:
+            abort(red('Could not define VM %s (status=%s): %s' % (host, status, text)))
+
+
+def _delete_vm(host, dc):
+    _es_json('delete /vm/%s/define' % host, dc=dc)
+
+
+def _worker_jobs(hosts, worker, rounds, dc, lock, writes):
+    """Return a job running rounds of all OPS against hosts (cycled) from one worker"""
+    def job():
+        for r in range(rounds):
+            for op, cmd, _, value_fun in OPS:
+                host = hosts[(worker + r) % len(hosts)]
+                w = Write(op, host, value_fun(worker * rounds + r))
+                w.start = time.time()
+                w.status = _timed_es_json(cmd % (host, w.value), dc=dc)[0]
+                w.end = time.time()
+
+                with lock:
+                    writes.append(w)
+
+    return job
+
+
+def _run_scenario(hosts_per_worker, workers, rounds, dc):
+    writes = []
+    lock = threading.Lock()
+    jobs = [_worker_jobs(hosts_per_worker(w), w, rounds, dc, lock, writes) for w in range(workers)]
+    start = time.time()
+    _run_concurrent(jobs, workers)
+    wall = time.time() - start
+
+    return writes, wall
+
+
+def _scenario_stats(name, writes):
+    stats = []
+
+    for op, _, _, _ in OPS:
+        s = LatencyStats('%s %s' % (name, op))
+
+        for w in writes:
+            if w.op == op:
+                s.add(w.duration, w.status)
+
+        stats.append(s)
+
+    return stats
+
+
+def _p50(writes):
+    return _percentile(sorted(w.duration for w in writes), 50)
+
+
+def _effective_concurrency(writes, wall):
+    """Average number of requests in flight (including es client startup, so it is an upper bound)"""
+    if not wall:
+        return 0
+
+    return sum(w.duration for w in writes) / wall
+
+
+def _check_final_state(host, writes, dc):
+    """Final value of every field must come from a successful write not superseded by a later write"""
+    consistent = True
+
+    for op, _, field, _ in OPS:
+        done = [w for w in writes if w.op == op and w.host == host and w.ok]
+
+        if not done:
+            continue
+
+        candidates = set(w.value for w in done if not any(x.start > w.end for x in done))
+        status, text = _es_json(GET_CMDS[op] % host, dc=dc)
+
+        try:
+            final = text['result'][field]
+        except (KeyError, TypeError):
+            print(red('    %s: could not read final state (status=%s)' % (op, status)))
+            consistent = False
+            continue
+
+        if final in candidates:
+            print(green('    %s: %s=%s is consistent' % (op, field, final)))
+        else:
+            print(red('    %s: %s=%s is not one of last written values %s' % (op, field, final, sorted(candidates))))
+            consistent = False
+
+    return consistent
+
+
+def _print_conflicts(name, writes):
+    conflicts = sum(1 for w in writes if w.status in CONFLICT_CODES)
+    errors = sum(1 for w in writes if not w.ok and w.status not in CONFLICT_CODES)
+    msg = '    %s: %d requests, %d conflict/lock responses, %d other errors' % (name, len(writes), conflicts, errors)
+
+    if conflicts or errors:
+        print(yellow(msg))
+    else:
+        print(msg)
+
+
+def contention(vms=4, workers=4, rounds=5, username=ADMIN_USERNAME, password=ADMIN_PASSWORD, net='lan', dc=DC):
+    """benchmark concurrent VM define updates of the same VM and of disjoint VMs"""
+    vms, workers, rounds = int(vms), int(workers), int(rounds)
+    vms = max(vms, workers)
+    hosts = [HOSTNAME % i for i in range(vms)]
+    common.ECHO_COMMANDS = False
+
+    status, text = _es_json('login -username %s -password %s' % (username, password), dc=None)
+
+    if status != 200:
+        abort(red('login failed: %s' % text))
+
+    consistent = True
+
+    try:
+        print(cyan('*** Defining %d VMs ***' % vms))
+
+        for host in hosts:
+            _define_vm(host, net, dc)
+
+        baseline, baseline_wall = _run_scenario(lambda w: hosts[:1], 1, rounds * workers, dc)
+        same, same_wall = _run_scenario(lambda w: hosts[:1], workers, rounds, dc)
+
+        # Before the disjoint scenario, which writes to the same VM again
+        print(cyan('*** Final state of %s ***' % hosts[0]))
+        consistent = _check_final_state(hosts[0], same, dc)
+
+        disjoint, disjoint_wall = _run_scenario(lambda w: [hosts[w]], workers, rounds, dc)
+
+        _print_latency_report('VM define contention (%d workers, %d rounds)' % (workers, rounds),
+                              _scenario_stats('serial', baseline) + _scenario_stats('same-vm', same) +
+                              _scenario_stats('disjoint', disjoint))
+
+        print(cyan('*** Conflicts ***'))
+        _print_conflicts('same-vm', same)
+        _print_conflicts('disjoint', disjoint)
+
+        base_p50 = _p50(baseline)
+        print(cyan('\n*** Latency inflation and serialisation ***'))
+        inflation = {}
+
+        for name, writes, wall in (('same-vm', same, same_wall), ('disjoint', disjoint, disjoint_wall)):
+            inflation[name] = _p50(writes) / base_p50
+            print('    %-10s p50 inflation: %+.3fs (x%.2f)  effective concurrency: %.2f/%d' % (
+                name, _p50(writes) - base_p50, inflation[name], _effective_concurrency(writes, wall), workers))
+
+        if inflation['same-vm'] < SERIALISED_INFLATION:
+            print(green('    define updates run concurrently'))
+        elif inflation['disjoint'] >= inflation['same-vm'] * 0.75:
+            print(yellow('    define updates appear to be serialised cluster-wide'))
+        else:
+            print(yellow('    define updates appear to be serialised per VM'))
+    finally:
+        for host in hosts:
+            _delete_vm(host, dc)
+
+    if not consistent:
+        abort(red('final state of %s is not consistent' % hosts[0]))
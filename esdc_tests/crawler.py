@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+GUI page render timing crawler.
+
+Fetches pages listed in validator/urls (the same list used for HTML validation) with the es_sessionid cookie,
+concurrently and repeatedly. For every page it records server time to first byte, total time, HTML size and number
+and weight of referenced static assets (stylesheets, scripts, images). Same-site links can be followed to discover
+more pages.
+"""
+
+import os
+import time
+import threading
+
+from esdc_tests.common import BASE_DIR, abort, red, yellow, cyan, _arg_bool
+from esdc_tests.bench import _percentile, _run_concurrent
+
+URLS_FILE = os.path.join(BASE_DIR, 'validator', 'urls')
+SKIP_LINKS = ('/accounts/logout',)  # Never follow links with side effects
+ASSET_EXTENSIONS = ('.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.woff', '.woff2', '.ttf',
+                    '.eot', '.map', '.pdf', '.zip')
+
+
+class _Fetcher(object):
+    """HTTP(S) client with one kept-alive connection per thread and host"""
+    def __init__(self, cookie, timeout):
+        self.cookie = cookie
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self, scheme, host):
+        import http.client
+
+        conns = self._local.__dict__.setdefault('conns', {})
+        conn = conns.get((scheme, host))
+
+        if conn is None:
+            if scheme == 'https':
+                import ssl
+                # noinspection PyProtectedMember
+                conn = http.client.HTTPSConnection(host, timeout=self.timeout, context=ssl._create_unverified_context())
+            else:
+                conn = http.client.HTTPConnection(host, timeout=self.timeout)
+
+            conns[(scheme, host)] = conn
+
+        return conn
+
+    def _drop(self, scheme, host):
+        conn = self._local.__dict__.get('conns', {}).pop((scheme, host), None)
+
+        if conn:
+            conn.close()
+
+    def fetch(self, url):
+        """Return (status, ttfb, total time, body) - status is None if the request failed"""
+        from urllib.parse import urlsplit
+
+        u = urlsplit(url)
+        path = u.path or '/'
+
+        if u.query:
+            path += '?' + u.query
+
+        headers = {'Accept-Encoding': 'identity'}
+
+        if self.cookie:
+            headers['Cookie'] = 'es_sessionid=%s' % self.cookie
+
+        for attempt in (1, 2):  # Reconnect once if a kept-alive connection was closed by the server
+            conn = self._connection(u.scheme, u.netloc)
+            start = time.time()
+
+            # noinspection PyBroadException
+            try:
+                conn.request('GET', path, headers=headers)
+                res = conn.getresponse()
+                ttfb = time.time() - start
+                body = res.read()
+            except Exception:
+                self._drop(u.scheme, u.netloc)
+
+                if attempt == 2:
+                    return None, None, time.time() - start, b''
+                continue
+
+            if res.getheader('connection', '').lower() == 'close':
+                self._drop(u.scheme, u.netloc)
+
+            return res.status, ttfb, time.time() - start, body
+
+
+def _parse_page(url, body):
+    """Return (assets, links) referenced by HTML page as absolute URLs"""
+    from html.parser import HTMLParser
+    from urllib.parse import urljoin, urldefrag
+
+    assets = []
+    links = []
+
+    class Parser(HTMLParser):
+        def handle_starttag(self, tag, attrs):
+            attrs = dict(attrs)
+
+            if tag == 'link' and attrs.get('href'):
+                rel = (attrs.get('rel') or '').lower()
+
+                if 'stylesheet' in rel or 'icon' in rel:
+                    assets.append(attrs['href'])
+            elif tag in ('script', 'img') and attrs.get('src'):
+                assets.append(attrs['src'])
+            elif tag == 'a' and attrs.get('href'):
+                links.append(attrs['href'])
+
+    parser = Parser()
+    parser.feed(body.decode('utf-8', 'replace'))
+    parser.close()
+
+    return ([urldefrag(urljoin(url, a))[0] for a in assets if not a.startswith('data:')],
+            [urldefrag(urljoin(url, a))[0] for a in links])
+
+
+def _same_site_page(base, url):
+    from urllib.parse import urlsplit
+
+    b, u = urlsplit(base), urlsplit(url)
+
+    if (u.scheme, u.netloc) != (b.scheme, b.netloc):
+        return False
+
+    if any(u.path.startswith(skip) for skip in SKIP_LINKS):
+        return False
+
+    return not u.path.lower().endswith(ASSET_EXTENSIONS)
+
+
+class _Page(object):
+    def __init__(self, url):
+        self.url = url
+        self.status = None
+        self.ttfb = []
+        self.total = []
+        self.size = 0
+        self.assets = []
+        self.links = []
+        self.errors = 0
+
+    def add(self, status, ttfb, total, body):
+        self.status = status
+
+        if status is None or status >= 400:
+            self.errors += 1
+
+        if ttfb is not None:
+            self.ttfb.append(ttfb)
+            self.total.append(total)
+            self.size = len(body)
+
+
+def _fetch_pages(fetcher, pages, workers, parse):
+    def job(page):
+        def fetch():
+            status, ttfb, total, body = fetcher.fetch(page.url)
+            page.add(status, ttfb, total, body)
+
+            if parse and status == 200:
+                page.assets, page.links = _parse_page(page.url, body)
+        return fetch
+
+    _run_concurrent([job(p) for p in pages], workers)
+
+
+def _read_urls(base_url, urls_file):
+    with open(urls_file) as f:
+        return [base_url.rstrip('/') + line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def _print_report(pages, asset_sizes):
+    print(cyan('\n*** GUI page timing (seconds) ***'))
+    print('    %-50s %6s %5s %7s %7s %7s %7s %9s %6s %9s' % ('page', 'status', 'n', 'ttfb50', 'ttfb90', 'total50',
+                                                               'total90', 'html B', 'assets', 'assets B'))
+
+    def p50(page):
+        return _percentile(sorted(page.total), 50) or 0
+
+    for page in sorted(pages, key=p50, reverse=True):
+        if not page.total:
+            print(red('    %-50s failed' % page.url[-50:]))
+            continue
+
+        ttfb, total = sorted(page.ttfb), sorted(page.total)
+        assets = set(page.assets)
+        line = '    %-50s %6s %5d %7.3f %7.3f %7.3f %7.3f %9d %6d %9d' % (
+            page.url[-50:], page.status, len(total), _percentile(ttfb, 50), _percentile(ttfb, 90),
+            _percentile(total, 50), _percentile(total, 90), page.size, len(assets),
+            sum(asset_sizes.get(a) or 0 for a in assets))
+
+        if page.errors:
+            line = red(line)
+
+        print(line)
+
+
+def crawl(base_url='', sessionid='', urls=URLS_FILE, repeat=5, workers=4, follow=False, depth=2, max_pages=200,
+          assets=True, timeout=10):
+    """measure GUI page timing (TTFB, total, HTML and asset size) of pages from validator/urls"""
+    base_url = base_url or os.environ.get('ES_GUI_URL', '')
+    sessionid = sessionid or os.environ.get('ES_VALIDATOR_SESSIONID', '')
+    repeat, workers, depth, max_pages = int(repeat), int(workers), int(depth), int(max_pages)
+    follow = _arg_bool(follow)
+    assets = _arg_bool(assets)
+
+    if not base_url:
+        abort(red('missing base_url (or ES_GUI_URL environment variable), e.g. https://mgmt01.local'))
+
+    if not sessionid:
+        print(yellow('No es_sessionid - only public pages will be available'))
+
+    fetcher = _Fetcher(sessionid, float(timeout))
+    pages = [_Page(url) for url in _read_urls(base_url, urls)]
+    known = set(p.url for p in pages)
+    level = pages
+
+    # First pass - discover assets and (optionally) follow links up to depth hops
+    for hop in range(depth + 1):
+        _fetch_pages(fetcher, level, workers, parse=True)
+
+        if not follow or hop == depth:
+            break
+
+        new = []
+
+        for page in level:
+            for link in page.links:
+                if link not in known and len(known) < max_pages and _same_site_page(base_url, link):
+                    known.add(link)
+                    new.append(_Page(link))
+
+        if not new:
+            break
+
+        print('    discovered %d new pages' % len(new))
+        pages.extend(new)
+        level = new
+
+    print(cyan('*** Fetching %d pages %d more times ***' % (len(pages), repeat - 1)))
+    _fetch_pages(fetcher, [p for p in pages for _ in range(repeat - 1)], workers, parse=False)
+
+    asset_sizes = {}
+
+    if assets:
+        unique = sorted(set(a for p in pages for a in p.assets))
+        print(cyan('*** Fetching %d static assets ***' % len(unique)))
+
+        def job(asset):
+            def fetch():
+                status, _, _, body = fetcher.fetch(asset)
+                asset_sizes[asset] = len(body) if status == 200 else None
+            return fetch
+
+        _run_concurrent([job(a) for a in unique], workers)
+
+    _print_report(pages, asset_sizes)
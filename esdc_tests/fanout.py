@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Fan-out runner for several DCs and installations.
+
+Every target is tested by separate estest.py processes with its own environment: DC (ESTEST_DC), installation
+(ERIGONES_HOME with the es command and/or ES_API_URL), credentials (ESTEST_USERNAME, ESTEST_PASSWORD) and es session
+file (ES_SESSION_FILE). Tasks run one after another in their own process (a test suite summary ends the process, so
+tasks=accounts+vm runs both suites). Test results of every process are saved into a JSON report (ESTEST_REPORT), merged
+per target and aggregated into one comparative report.
+
+Targets are virtual DCs of the local installation (dcs=main+admin) or are loaded from a JSON file (config=targets.json):
+
+    [{"name": "prod-main", "erigones_home": "/opt/erigones", "dc": "main"},
+     {"name": "lab", "api_url": "https://10.0.0.5/api", "dc": "main", "username": "admin", "password": "secret"}]
+
+The test suites create the same test user and VM, which are global objects in one installation. Therefore targets
+of one installation run one after another (in one lane) and different installations run concurrently, unless
+parallel=true is used (safe only for read-only tasks, e.g. ping).
+"""
+
+import os
+import sys
+import json
+import time
+
+from esdc_tests.common import BASE_DIR, ERIGONES_HOME, abort, red, green, cyan, _arg_list, _arg_bool
+from esdc_tests.bench import _percentile, _run_concurrent
+
+ESTEST = os.path.join(BASE_DIR, 'bin', 'estest.py')
+
+
+class Target(object):
+    def __init__(self, name, dc='main', erigones_home='', api_url='', username='', password=''):
+        self.name = name
+        self.dc = dc
+        self.erigones_home = erigones_home
+        self.api_url = api_url
+        self.username = username
+        self.password = password
+        self.rc = None
+        self.duration = None
+        self.report = None
+
+    @property
+    def installation(self):
+        return self.erigones_home or ERIGONES_HOME, self.api_url
+
+    def env(self, logdir):
+        env = dict(os.environ)
+        env['ESTEST_DC'] = self.dc
+        env['ES_SESSION_FILE'] = os.path.join(logdir, '%s.session' % self.name)
+        env['ESTEST_REPORT'] = self.report_file(logdir)
+
+        for key, value in (('ERIGONES_HOME', self.erigones_home), ('ES_API_URL', self.api_url),
+                           ('ESTEST_USERNAME', self.username), ('ESTEST_PASSWORD', self.password)):
+            if value:
+                env[key] = value
+
+        return env
+
+    def report_file(self, logdir):
+        return os.path.join(logdir, '%s.json' % self.name)
+
+    def log_file(self, logdir):
+        return os.path.join(logdir, '%s.log' % self.name)
+
+
+def _load_targets(dcs, config):
+    if config:
+        try:
+            with open(config) as f:
+                targets = [Target(**t) for t in json.load(f)]
+        except (IOError, ValueError, TypeError) as e:
+            abort(red('could not load targets from %s: %s' % (config, e)))
+    else:
+        targets = [Target(dc, dc=dc) for dc in _arg_list(dcs)]
+
+    names = [t.name for t in targets]
+
+    if not targets:
+        abort(red('no targets'))
+
+    if len(set(names)) != len(names):
+        abort(red('target names must be unique'))
+
+    return targets
+
+
+def _lanes(targets, parallel):
+    """Group targets into lists run one after another"""
+    if parallel:
+        return [[t] for t in targets]
+
+    lanes = {}
+
+    for t in targets:
+        lanes.setdefault(t.installation, []).append(t)
+
+    return list(lanes.values())
+
+
+def _load_report(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def _merge_reports(report, other):
+    if report is None or other is None:
+        return report or other
+
+    for key in ('run', 'failed', 'warnings'):
+        report[key] += other[key]
+
+    report['tests'].extend(other['tests'])
+
+    return report
+
+
+def _run_target(target, tasks, logdir):
+    """Run every task in a separate process and merge their test reports"""
+    import subprocess
+
+    report_file = target.report_file(logdir)
+    env = target.env(logdir)
+    target.rc = 0
+    target.report = None
+    start = time.time()
+
+    with open(target.log_file(logdir), 'w') as log:
+        for task in tasks:
+            if os.path.exists(report_file):
+                os.remove(report_file)
+
+            log.flush()
+            rc = subprocess.call([sys.executable, ESTEST, task], env=env, stdout=log, stderr=subprocess.STDOUT)
+            target.rc = target.rc or rc
+            target.report = _merge_reports(target.report, _load_report(report_file))
+
+    target.duration = time.time() - start
+
+    if target.report:
+        with open(report_file, 'w') as f:
+            json.dump(target.report, f, indent=4)
+
+    line = '    %-20s finished in %.1fs (rc=%s)' % (target.name, target.duration, target.rc)
+    print(green(line) if target.rc == 0 else red(line))
+
+
+def _print_targets(targets, logdir):
+    print(cyan('\n*** Targets ***'))
+    print('    %-20s %-10s %4s %8s %6s %6s %8s %8s %8s' % ('target', 'dc', 'rc', 'time s', 'tests', 'failed', 'p50 s',
+                                                       'p90 s', 'max s'))
+
+    for t in targets:
+        if not t.report:
+            print(red('    %-20s %-10s %4s %8.1f no test report (see %s)' % (t.name, t.dc, t.rc, t.duration,
+                                                                          t.log_file(logdir))))
+            continue
+
+        durations = sorted(x['duration'] for x in t.report['tests'])
+        line = '    %-20s %-10s %4s %8.1f %6d %6d %8.3f %8.3f %8.3f' % (
+            t.name, t.dc, t.rc, t.duration, t.report['run'], t.report['failed'], _percentile(durations, 50) or 0,
+            _percentile(durations, 90) or 0, durations[-1] if durations else 0)
+        print(red(line) if t.report['failed'] else line)
+
+
+def _print_tests(targets, top):
+    """Print tests with different results across targets and the slowest tests on every target"""
+    reported = [t for t in targets if t.report]
+    results = {}  # test name -> {target name: (ok, duration)}
+
+    for t in reported:
+        for x in t.report['tests']:
+            # A test can run several times in one suite; keep the worst result and the longest duration
+            ok, duration = results.setdefault(x['name'], {}).get(t.name, (True, 0))
+            results[x['name']][t.name] = (ok and x['ok'], max(duration, x['duration']))
+
+    failed = [(name, sorted(n for n, (ok, _) in res.items() if not ok)) for name, res in sorted(results.items())]
+    failed = [(name, names) for name, names in failed if names]
+
+    if failed:
+        print(cyan('\n*** Failed tests ***'))
+
+        for name, names in failed:
+            print(red('    %-45s %s' % (name, ', '.join(names))))
+
+    if not reported:
+        return
+
+    print(cyan('\n*** Slowest tests (seconds) ***'))
+    print('    %-45s' % 'test' + ''.join(' %12s' % t.name[:12] for t in reported))
+    slowest = sorted(results.items(), key=lambda x: max(d for _, d in x[1].values()), reverse=True)
+
+    for name, res in slowest[:top]:
+        print('    %-45s' % name[:45] + ''.join(' %12s' % ('%.3f' % res[t.name][1] if t.name in res else '-')
+                                                 for t in reported))
+
+
+def fanout(tasks='all', dcs='main', config='', parallel=False, logdir='/tmp/estest-fanout', top=10):
+    """run tasks against several DCs and installations concurrently and compare the results (tasks=accounts+vm)"""
+    tasks = _arg_list(tasks)
+    top = int(top)
+    targets = _load_targets(dcs, config)
+    lanes = _lanes(targets, _arg_bool(parallel))
+
+    if not os.path.isdir(logdir):
+        os.makedirs(logdir)
+
+    print(cyan('*** Running %s on %d targets in %d lanes (logs in %s) ***' % (' '.join(tasks), len(targets),
+                                                                                len(lanes), logdir)))
+
+    def job(lane):
+        def run():
+            for target in lane:
+                _run_target(target, tasks, logdir)
+        return run
+
+    start = time.time()
+    _run_concurrent([job(lane) for lane in lanes], len(lanes))
+    elapsed = time.time() - start
+
+    _print_targets(targets, logdir)
+    _print_tests(targets, top)
+
+    failed = [t for t in targets if t.rc != 0]
+    print('\n    wall time: %.1fs (sum of target times: %.1fs)' % (elapsed, sum(t.duration for t in targets)))
+
+    if failed:
+        print(red('    failed targets: %s' % ', '.join(t.name for t in failed)))
+
+    raise SystemExit(len(failed))
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+IP address allocation scaling benchmark.
+
+NICs created without an IP address get the next free address of the network. The ip_fixture task generates
+vms.ipaddress records for the whole network range (e.g. a /16) with a given fraction of addresses assigned to a test
+VM (vm argument, its uuid is read from the API). The network must already exist (without IP addresses) and its uuid
+must be passed as the subnet argument:
+
+    bin/estest.py ip_fixture:subnet=<uuid>,vm=<test vm>,network=10.200.0.0,netmask=255.255.0.0,fill=0.9
+    $ERIGONES_HOME/bin/ctl.sh loaddata /tmp/ipaddresses.json
+
+The ipalloc task measures latency of automatic IP assignment (create /vm/<host>/define/nic/<n>) with 1..N concurrent
+NIC creations and checks that no address was assigned twice. With fills=0.5+0.9+0.99 (and subnet) it generates and
+loads the fixture for every fill level itself (on the management server only); used addresses are assigned to the
+first benchmark VM. The records have the same primary keys for every fill level, so loading a fixture overwrites the
+previous fill level; they are removed at the end of the task (the task fails if they could not be removed).
+Records loaded manually from an ip_fixture are removed with the ip_cleanup task (same network, netmask and start):
+
+    bin/estest.py ip_cleanup:network=10.200.0.0,netmask=255.255.0.0
+"""
+
+import time
+import threading
+
+from esdc_tests import common
+from esdc_tests.common import DC, CTL_SH, ADMIN_USERNAME, ADMIN_PASSWORD, STATUS_CODES_OK, abort, red, yellow, cyan, \
+    local, _es_json, _arg_list, _ctl_shell
+from esdc_tests.bench import LatencyStats, _timed_es_json, _print_latency_report, _run_concurrent
+
+HOSTNAME = 'ipalloc%04d.example.com'
+DELETE_IPS = 'from vms.models import IPAddress; IPAddress.objects.filter(pk__gte=%d, pk__lt=%d).delete()'
+IP_USAGE_VM = 1
+
+FILL_PATTERNS = ('front', 'random')
+
+
+def _hosts(network, netmask):
+    """Return list of all host addresses of a network"""
+    import ipaddress
+
+    try:
+        return [str(ip) for ip in ipaddress.ip_network('%s/%s' % (network, netmask)).hosts()]
+    except ValueError as e:
+        return abort(red('invalid network: %s' % e))
+
+
+def _ip_records(subnet, network, netmask, fill, pattern, vm, start, seed=None):
+    """Return list of vms.ipaddress fixture records for all host addresses of a network"""
+    import random
+
+    hosts = _hosts(network, netmask)
+    used = int(len(hosts) * fill)
+
+    if pattern == 'random':
+        used_ips = set(random.Random(seed).sample(hosts, used))
+    else:  # Worst case for a linear free address search
+        used_ips = set(hosts[:used])
+
+    return [{
+        'pk': start + i,
+        'model': 'vms.ipaddress',
+        'fields': {
+            'ip': ip,
+            'subnet': subnet,
+            'vm': vm if ip in used_ips else None,
+            'usage': IP_USAGE_VM,
+            'note': 'estest ipalloc' if ip in used_ips else '',
+        }
+    } for i, ip in enumerate(hosts)]
+
+
+def _write_fixture(output, records):
+    import json
+
+    with open(output, 'w') as f:
+        json.dump(records, f)
+
+
+def _vm_uuid(hostname, dc):
+    status, text = _es_json('get /vm/%s' % hostname, dc=dc)
+
+    try:
+        return text['result']['uuid']
+    except (KeyError, TypeError):
+        return abort(red('Could not get uuid of VM %s (status=%s): %s' % (hostname, status, text)))
+
+
+def _login(username, password):
+    status, text = _es_json('login -username %s -password %s' % (username, password), dc=None)
+
+    if status != 200:
+        abort(red('login failed: %s' % text))
+
+
+def ip_fixture(subnet='', network='10.200.0.0', netmask='255.255.0.0', fill=0.9, pattern='front', vm='',
+               output='/tmp/ipaddresses.json', start=100000, seed=None, username=ADMIN_USERNAME,
+               password=ADMIN_PASSWORD, dc=DC):
+    """generate fixture with IP addresses of a network, fill is the fraction of addresses used by a test VM"""
+    if not subnet:
+        abort(red('missing subnet (uuid of an existing network without IP addresses)'))
+
+    if not vm:
+        abort(red('missing vm (hostname of a test VM, which gets the used addresses)'))
+
+    if pattern not in FILL_PATTERNS:
+        abort(red('unknown fill pattern "%s" (allowed: %s)' % (pattern, ', '.join(FILL_PATTERNS))))
+
+    common.ECHO_COMMANDS = False
+    _login(username, password)
+    records = _ip_records(subnet, network, netmask, float(fill), pattern, _vm_uuid(vm, dc), int(start), seed=seed)
+    _write_fixture(output, records)
+    used = sum(1 for r in records if r['fields']['vm'])
+    print('%d IP address records (%d used) written to %s' % (len(records), used, output))
+
+
+def _delete_ip_records(start, count):
+    """Remove vms.ipaddress records with primary keys from start to start + count (on the management server only)"""
+    return _ctl_shell(DELETE_IPS % (start, start + count))
+
+
+def ip_cleanup(network='10.200.0.0', netmask='255.255.0.0', start=100000):
+    """remove IP address records loaded from an ip_fixture (on the management server only)"""
+    start, count = int(start), len(_hosts(network, netmask))
+
+    if _delete_ip_records(start, count).failed:
+        abort(red('could not remove IP address records %d-%d' % (start, start + count - 1)))
+
+    print('IP address records %d-%d removed' % (start, start + count - 1))
+
+
+def _define_vms(count, dc):
+    for i in range(count):
+        host = HOSTNAME % i
+        alias = host.split('.')[0]
+        status, text = _es_json('create /vm/%s/define -alias %s -vcpus 1 -ram 256 -ostype 1' % (host, alias), dc=dc)
+
+        if status not in STATUS_CODES_OK:
+            abort(red('Could not define VM %s (status=%s): %s' % (host, status, text)))
+
+
+def _delete_vms(count, dc):
+    for i in range(count):
+        _es_json('delete /vm/%s/define' % (HOSTNAME % i), dc=dc)
+
+
+def _nic_ips(hosts, nic_id, dc):
+    ips = {}
+
+    for host in hosts:
+        status, text = _es_json('get /vm/%s/define/nic/%d' % (host, nic_id), dc=dc)
+
+        if status == 200:
+            ips[host] = text['result'].get('ip')
+
+    return ips
+
+
+def _create_nics(hosts, nic_id, net, workers, dc):
+    """Create one NIC on every host with workers concurrent requests. Return LatencyStats, throughput, duplicates"""
+    stats = LatencyStats('%d workers: create nic' % workers)
+    lock = threading.Lock()
+
+    def job(host):
+        def create():
+            status, _, duration = _timed_es_json('create /vm/%s/define/nic/%d -net %s' % (host, nic_id, net), dc=dc)
+
+            with lock:
+                stats.add(duration, status)
+        return create
+
+    start = time.time()
+    _run_concurrent([job(host) for host in hosts], workers)
+    throughput = len(hosts) / (time.time() - start)
+
+    ips = [ip for ip in _nic_ips(hosts, nic_id, dc).values() if ip]
+    duplicates = len(ips) - len(set(ips))
+
+    return stats, throughput, duplicates
+
+
+def _delete_nics(hosts, nic_id, dc):
+    for host in hosts:
+        _es_json('delete /vm/%s/define/nic/%d' % (host, nic_id), dc=dc)
+
+
+def _run_levels(label, net, nics, workers, dc):
+    """Run NIC creation for all worker counts and return number of IP addresses assigned more than once"""
+    hosts = [HOSTNAME % i for i in range(nics)]
+    stats = []
+    total_duplicates = 0
+
+    for w in workers:
+        s, throughput, duplicates = _create_nics(hosts, 1, net, w, dc)
+        _delete_nics(hosts, 1, dc)  # Release the addresses, so that the fill level stays the same
+        stats.append(s)
+        print('    %s, %d workers: %.2f NICs/s' % (label, w, throughput))
+
+        if duplicates:
+            total_duplicates += duplicates
+            print(red('    %s, %d workers: %d IP addresses assigned more than once' % (label, w, duplicates)))
+
+    _print_latency_report('NIC creation with automatic IP assignment (%s)' % label, stats)
+
+    return total_duplicates
+
+
+def ipalloc(net='lan', nics=20, workers='1+4+8', fills='', subnet='', network='10.200.0.0', netmask='255.255.0.0',
+            pattern='front', start=100000, username=ADMIN_USERNAME, password=ADMIN_PASSWORD, dc=DC):
+    """measure NIC creation latency with automatic IP assignment for concurrent requests and fill levels"""
+    nics = int(nics)
+    workers = [int(i) for i in _arg_list(workers)]
+    fills = [float(i) for i in _arg_list(fills)]
+    common.ECHO_COMMANDS = False
+
+    if fills and not subnet:
+        abort(red('fill levels require the subnet argument (uuid of the network)'))
+
+    if nics < 1:
+        abort(red('at least one NIC is required'))
+
+    _login(username, password)
+    start = int(start)
+    duplicates = loaded = 0
+    cleanup_failed = False
+
+    try:
+        print(cyan('*** Defining %d VMs ***' % nics))
+        _define_vms(nics, dc)
+        vm_uuid = _vm_uuid(HOSTNAME % 0, dc) if fills else None  # Used addresses belong to our own test VM
+
+        if not fills:
+            duplicates += _run_levels('current fill', net, nics, workers, dc)
+
+        for fill in fills:
+            output = '/tmp/ipalloc-%s.json' % fill
+            print(cyan('*** Loading %s (fill %.0f%%) ***' % (output, fill * 100)))
+            records = _ip_records(subnet, network, netmask, fill, pattern, vm_uuid, start)
+            _write_fixture(output, records)
+            loaded = len(records)
+            res = local('%s loaddata %s' % (CTL_SH, output))
+
+            if res.failed:
+                print(yellow(res.stderr))
+                abort(red('could not load %s' % output))
+
+            duplicates += _run_levels('fill %.0f%%' % (fill * 100), net, nics, workers, dc)
+    finally:
+        if loaded:
+            print(cyan('*** Removing %d IP address records ***' % loaded))
+            cleanup_failed = _delete_ip_records(start, loaded).failed
+
+        _delete_vms(nics, dc)
+
+        if cleanup_failed:
+            abort(red('could not remove IP address records %d-%d (run ip_cleanup)' % (start, start + loaded - 1)))
+
+    if duplicates:
+        abort(red('%d IP addresses were assigned to more than one NIC' % duplicates))
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Command line entry point.
+
+Tasks are public functions defined in one of the TASK_MODULES. Task modules are imported lazily - running a task
+imports only the modules searched before the task is found, so quick tasks (e.g. ping) start fast. Task arguments
+use the Fabric 1.x syntax: task:arg1,arg2,key=value.
+"""
+
+import sys
+import types
+from importlib import import_module
+
+TASK_MODULES = ('suites', 'tasklog', 'contention', 'throttle', 'payload', 'soak', 'snapshot', 'crawler', 'analytics',
+                'fanout', 'capacity', 'ipalloc', 'monitor', 'callback')
+
+USAGE = '''Usage: estest.py [options] <task>[:arg1,arg2=val2,...] ...
+
+Options:
+  -h, --help            show this help message and exit
+  -l, --list            print list of possible tasks and exit
+  -F, --shortlist       print task names only and exit
+  -d NAME, --display=NAME
+                        print detailed info about task NAME
+'''
+
+
+class TaskNotFound(Exception):
+    pass
+
+
+def _task_module(name):
+    return import_module('esdc_tests.' + name)
+
+
+def _module_tasks(module):
+    """Return dict of tasks defined (not just imported) in module"""
+    return dict((name, obj) for name, obj in vars(module).items()
+                if not name.startswith('_') and isinstance(obj, types.FunctionType) and
+                obj.__module__ == module.__name__)
+
+
+def _all_tasks():
+    tasks = {}
+
+    for mod_name in TASK_MODULES:
+        tasks.update(_module_tasks(_task_module(mod_name)))
+
+    return tasks
+
+
+def _get_task(name):
+    if not name.startswith('_'):
+        for mod_name in TASK_MODULES:
+            module = _task_module(mod_name)
+            fun = getattr(module, name, None)
+
+            if isinstance(fun, types.FunctionType) and fun.__module__ == module.__name__:
+                return fun
+
+    raise TaskNotFound(name)
+
+
+def _task_doc(fun, full=False):
+    doc = (fun.__doc__ or '').strip()
+
+    if full:
+        return doc
+
+    return doc.splitlines()[0] if doc else ''
+
+
+def _split_escaped(sep, text):
+    """Split text by sep, but not by a backslash escaped sep"""
+    parts = ['']
+    escaped = '\\' + sep
+    i = 0
+
+    while i < len(text):
+        if text.startswith(escaped, i):
+            parts[-1] += sep
+            i += 2
+        elif text[i] == sep:
+            parts.append('')
+            i += 1
+        else:
+            parts[-1] += text[i]
+            i += 1
+
+    return parts
+
+
+def _parse_task_spec(spec):
+    """Parse Fabric style task specification: task:arg1,arg2,key=value"""
+    name, _, argstr = spec.partition(':')
+    args = []
+    kwargs = {}
+
+    if argstr:
+        for arg in _split_escaped(',', argstr):
+            kv = _split_escaped('=', arg)
+
+            if len(kv) == 2:
+                kwargs[kv[0]] = kv[1]
+            else:
+                args.append(arg)
+
+    return name, args, kwargs
+
+
+def _save_report():
+    """Save test results if ESTEST_REPORT is set (also when a task ends the run by SystemExit)"""
+    from esdc_tests import common
+
+    if common.REPORT_FILE:
+        common._save_report(common.REPORT_FILE)
+
+
+def list_tasks(short=False):
+    tasks = _all_tasks()
+
+    if short:
+        print('\n'.join(sorted(tasks)))
+        return
+
+    width = max(len(name) for name in tasks)
+    print('Available commands:\n')
+
+    for name in sorted(tasks):
+        doc = _task_doc(tasks[name])
+
+        if doc:
+            print('    %s  %s' % (name.ljust(width), doc))
+        else:
+            print('    %s' % name)
+
+
+def display_task(name):
+    try:
+        fun = _get_task(name)
+    except TaskNotFound:
+        sys.stderr.write('Task "%s" not found.\n' % name)
+        return 1
+
+    print('Displaying detailed information for task \'%s\':\n' % name)
+    print('    %s\n' % (_task_doc(fun, full=True) or 'No docstring provided'))
+
+    return 0
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if not argv:
+        argv = ['-l']
+
+    specs = []
+    argv = list(argv)
+
+    while argv:
+        opt = argv.pop(0)
+
+        if opt in ('-h', '--help'):
+            sys.stdout.write(USAGE)
+            return 0
+        elif opt in ('-l', '--list'):
+            list_tasks()
+            return 0
+        elif opt in ('-F', '--shortlist'):
+            list_tasks(short=True)
+            return 0
+        elif opt in ('-d', '--display') or opt.startswith('--display='):
+            if '=' in opt:
+                return display_task(opt.split('=', 1)[1])
+            if not argv:
+                sys.stderr.write('Option %s requires an argument\n' % opt)
+                return 2
+            return display_task(argv.pop(0))
+        elif opt.startswith('-'):
+            sys.stderr.write(USAGE)
+            sys.stderr.write('\nerror: no such option: %s\n' % opt)
+            return 2
+        else:
+            specs.append(_parse_task_spec(opt))
+
+    tasks = []
+
+    for name, args, kwargs in specs:
+        try:
+            tasks.append((_get_task(name), args, kwargs))
+        except TaskNotFound:
+            sys.stderr.write('\nWarning: Command not found:\n\n    %s\n\n' % name)
+            list_tasks()
+            return 1
+
+    try:
+        for fun, args, kwargs in tasks:
+            fun(*args, **kwargs)
+    except KeyboardInterrupt:
+        sys.stderr.write('\nStopped.\n')
+        return 1
+    finally:
+        _save_report()
+
+    print('\nDone.')
+
+    return 0
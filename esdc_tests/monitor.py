@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic monitoring daemon.
+
+Runs ping and a small set of read-only API requests on a fixed schedule in one process, using one API session
+(re-login when the token expires). Latency histograms and success/failure counters of every probe are exported in
+the Prometheus text format - written atomically into a file (e.g. for the node_exporter textfile collector) and/or
+served over HTTP (/metrics):
+
+    bin/estest.py monitor:interval=30,output=/var/lib/node_exporter/esdc.prom
+    bin/estest.py monitor:interval=30,port=9188
+"""
+
+import os
+import time
+import threading
+
+from esdc_tests.common import DC, ADMIN_USERNAME, ADMIN_PASSWORD, abort, red, cyan, _arg_list
+from esdc_tests.api import Api, ApiError
+
+# name -> (resource, GET parameters, send dc parameter)
+PROBES = {
+    'ping': ('/ping', {}, False),
+    'vm': ('/vm', {}, True),
+    'vm-status': ('/vm/status', {}, True),
+    'task': ('/task', {}, True),
+    'task-log': ('/task/log', {'page': 1}, True),
+    'node': ('/node', {}, False),
+}
+DEFAULT_PROBES = 'ping+vm+vm-status+task+task-log+node'
+
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+AUTH_FAILED = (401, 403)
+
+
+class ProbeMetrics(object):
+    """Latency histogram and result counters of one probe"""
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.success = 0
+        self.failure = 0
+        self.up = 0
+        self.last_success = 0
+
+    def observe(self, duration, ok):
+        self.count += 1
+        self.sum += duration
+
+        for i, le in enumerate(BUCKETS):
+            if duration <= le:
+                self.buckets[i] += 1
+
+        if ok:
+            self.success += 1
+            self.last_success = time.time()
+        else:
+            self.failure += 1
+
+        self.up = 1 if ok else 0
+
+
+class Metrics(object):
+    def __init__(self, probes, dc):
+        self.dc = dc
+        self.probes = dict((name, ProbeMetrics()) for name in probes)
+        self.logins = {'success': 0, 'failure': 0}
+        self.iterations = 0
+        self.lock = threading.Lock()
+
+    def render(self):
+        """Return metrics in Prometheus text exposition format"""
+        lines = []
+        dc = 'dc="%s"' % self.dc
+
+        def metric(name, kind, text):
+            lines.append('# HELP %s %s' % (name, text))
+            lines.append('# TYPE %s %s' % (name, kind))
+
+        with self.lock:
+            probes = sorted(self.probes.items())
+
+            metric('esdc_probe_duration_seconds', 'histogram', 'Danube Cloud API probe latency.')
+            for name, m in probes:
+                labels = '%s,probe="%s"' % (dc, name)
+
+                for le, n in zip(BUCKETS, m.buckets):
+                    lines.append('esdc_probe_duration_seconds_bucket{%s,le="%s"} %d' % (labels, le, n))
+
+                lines.append('esdc_probe_duration_seconds_bucket{%s,le="+Inf"} %d' % (labels, m.count))
+                lines.append('esdc_probe_duration_seconds_sum{%s} %.6f' % (labels, m.sum))
+                lines.append('esdc_probe_duration_seconds_count{%s} %d' % (labels, m.count))
+
+            metric('esdc_probe_requests_total', 'counter', 'Danube Cloud API probe results.')
+            for name, m in probes:
+                lines.append('esdc_probe_requests_total{%s,probe="%s",result="success"} %d' % (dc, name, m.success))
+                lines.append('esdc_probe_requests_total{%s,probe="%s",result="failure"} %d' % (dc, name, m.failure))
+
+            metric('esdc_probe_up', 'gauge', 'Result of the last probe (1 = success).')
+            for name, m in probes:
+                lines.append('esdc_probe_up{%s,probe="%s"} %d' % (dc, name, m.up))
+
+            metric('esdc_probe_last_success_timestamp_seconds', 'gauge', 'Time of the last successful probe.')
+            for name, m in probes:
+                lines.append('esdc_probe_last_success_timestamp_seconds{%s,probe="%s"} %d' % (dc, name,
+                                                                                                m.last_success))
+
+            metric('esdc_monitor_logins_total', 'counter', 'API logins done by the monitor.')
+            for result, n in sorted(self.logins.items()):
+                lines.append('esdc_monitor_logins_total{%s,result="%s"} %d' % (dc, result, n))
+
+            metric('esdc_monitor_iterations_total', 'counter', 'Completed monitoring iterations.')
+            lines.append('esdc_monitor_iterations_total{%s} %d' % (dc, self.iterations))
+
+        return '\n'.join(lines) + '\n'
+
+
+def _write_metrics(path, text):
+    """Replace metrics file atomically"""
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+
+    with open(tmp, 'w') as f:
+        f.write(text)
+
+    os.rename(tmp, path)
+
+
+def _serve_metrics(metrics, bind, port):
+    """Serve metrics over HTTP in a daemon thread"""
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer((bind, port), Handler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics')
+    thread.daemon = True
+    thread.start()
+
+    return server
+
+
+class _Monitor(object):
+    def __init__(self, api, metrics, username, password):
+        self.api = api
+        self.metrics = metrics
+        self.username = username
+        self.password = password
+
+    def login(self):
+        try:
+            self.api.login(self.username, self.password)
+        except ApiError as e:
+            ok = False
+            print(red('%s login failed: %s' % (time.strftime('%Y-%m-%d %H:%M:%S'), e)))
+        else:
+            ok = True
+
+        with self.metrics.lock:
+            self.metrics.logins['success' if ok else 'failure'] += 1
+
+        return ok
+
+    def _request(self, name):
+        resource, params, dc = PROBES[name]
+        start = time.time()
+
+        try:
+            res = self.api.request('GET', resource, params=params, dc=dc)
+        except ApiError as e:
+            return None, str(e), time.time() - start
+
+        ok = res.status == 200 and (name != 'ping' or res.text == 'pong')
+
+        return ok, res.status, res.duration
+
+    def probe(self, name):
+        ok, status, duration = self._request(name)
+
+        if status in AUTH_FAILED and self.username and self.login():  # Session token expired
+            ok, status, duration = self._request(name)
+
+        with self.metrics.lock:
+            self.metrics.probes[name].observe(duration, ok)
+
+        if not ok:
+            print(red('%s probe %s failed (%s) after %.3fs' % (time.strftime('%Y-%m-%d %H:%M:%S'), name, status,
+                                                               duration)))
+
+
+def monitor(interval=60, probes=DEFAULT_PROBES, output='', port=0, bind='127.0.0.1', duration=0,
+            username=ADMIN_USERNAME, password=ADMIN_PASSWORD, timeout=10, dc=DC):
+    """run ping and read-only API probes periodically and export Prometheus metrics (output=file and/or port=N)"""
+    interval, port, duration = float(interval), int(port), float(duration)
+    probes = _arg_list(probes)
+
+    for name in probes:
+        if name not in PROBES:
+            abort(red('unknown probe "%s" (allowed: %s)' % (name, ', '.join(sorted(PROBES)))))
+
+    if not output and not port:
+        abort(red('missing output file or port for metrics'))
+
+    metrics = Metrics(probes, dc)
+    mon = _Monitor(Api(dc=dc, timeout=float(timeout)), metrics, username, password)
+
+    if port:
+        _serve_metrics(metrics, bind, port)
+
+    print(cyan('*** Monitoring %s every %ss (metrics: %s) ***' % (', '.join(probes), interval, ' '.join(
+        x for x in (output, port and 'http://%s:%d/metrics' % (bind, port)) if x))))
+
+    if username:
+        mon.login()
+
+    start = next_run = time.time()
+
+    while not duration or time.time() - start < duration:
+        for name in probes:
+            mon.probe(name)
+
+        with metrics.lock:
+            metrics.iterations += 1
+
+        if output:
+            _write_metrics(output, metrics.render())
+
+        # Fixed rate schedule; skip runs missed because of slow probes
+        next_run += interval
+        now = time.time()
+
+        if next_run < now:
+            next_run += ((now - next_run) // interval + 1) * interval
+
+        time.sleep(next_run - now)
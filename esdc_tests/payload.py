@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Response size and compression benchmark for large API payloads.
+
+Every endpoint is requested with and without gzip content encoding. The report shows raw and compressed sizes,
+transfer times, client-side JSON parsing time and an estimated transfer time over a slow (remote DC) link. If the API
+does not compress responses, the compressed size is computed locally to show the possible saving. The field report
+shows which fields of the returned objects take most of the payload, i.e. where field trimming would pay off.
+
+The payload grows with the number of VMs, so the measurement can be repeated for several numbers of additional
+dummy VM definitions (sizes).
+"""
+
+import json
+import time
+
+from esdc_tests.common import DC, ADMIN_USERNAME, ADMIN_PASSWORD, STATUS_CODES_OK, abort, red, yellow, cyan, _arg_list
+from esdc_tests.bench import _percentile
+from esdc_tests.api import Api, ApiError
+
+HOSTNAME = 'payload%04d.example.com'
+
+ENDPOINTS = (
+    ('vm-full', '/vm', {'full': 'true'}),
+    ('vm-status', '/vm/status', {}),
+    ('task-log', '/task/log', {}),
+)
+
+
+def _median(values):
+    return _percentile(sorted(values), 50)
+
+
+def _result_items(text):
+    """Return list of objects from API response text"""
+    if isinstance(text, dict):
+        text = text.get('result', text.get('results', text))
+
+    if isinstance(text, list):
+        return [i for i in text if isinstance(i, dict)]
+
+    return []
+
+
+def _field_sizes(items):
+    """Return list of (field, bytes) sorted by bytes taken by the field in serialized objects"""
+    sizes = {}
+
+    for item in items:
+        for key, value in item.items():
+            # "key": value,
+            sizes[key] = sizes.get(key, 0) + len(key) + 4 + len(json.dumps(value))
+
+    return sorted(sizes.items(), key=lambda x: x[1], reverse=True)
+
+
+def _measure(api, resource, params, repeat):
+    import gzip
+
+    plain, compressed = [], []
+
+    for _ in range(repeat):
+        plain.append(api.request('GET', resource, params=params, headers={'Accept-Encoding': 'identity'}))
+        compressed.append(api.request('GET', resource, params=params, headers={'Accept-Encoding': 'gzip'}))
+
+    res = plain[-1]
+
+    if res.status not in STATUS_CODES_OK:
+        return None
+
+    raw = res.body
+    server_gzip = compressed[-1].header('content-encoding') == 'gzip'
+
+    if server_gzip:
+        gzip_size = len(compressed[-1].body)
+    else:
+        gzip_size = len(gzip.compress(raw, 6))
+
+    start = time.time()
+    text = json.loads(raw.decode('utf-8'))
+    parse_time = time.time() - start
+    items = _result_items(text)
+
+    return {
+        'raw': len(raw),
+        'gzip': gzip_size,
+        'server_gzip': server_gzip,
+        'time_plain': _median([r.duration for r in plain]),
+        'time_gzip': _median([r.duration for r in compressed]),
+        'ttfb': _median([r.ttfb for r in plain]),
+        'parse': parse_time,
+        'items': len(items),
+        'fields': _field_sizes(items),
+    }
+
+
+def _define_vms(api, start, stop):
+    for i in range(start, stop):
+        res = api.es('create', '/vm/%s/define' % (HOSTNAME % i), alias='payload%04d' % i, vcpus=1, ram=256, ostype=1)
+
+        if res.status not in STATUS_CODES_OK:
+            abort(red('could not define VM %s (status=%s): %s' % (HOSTNAME % i, res.status, res.text)))
+
+
+def _delete_vms(api, count):
+    for i in range(count):
+        api.es('delete', '/vm/%s/define' % (HOSTNAME % i))
+
+
+def _print_report(size, results, bandwidth):
+    print(cyan('\n*** Payload sizes with %d additional VMs ***' % size))
+    print('    %-10s %6s %10s %10s %6s %9s %9s %9s %9s %11s %11s' % (
+        'endpoint', 'items', 'raw B', 'gzip B', 'ratio', 'ttfb', 't-plain', 't-gzip', 'parse', 'link-plain',
+        'link-gzip'))
+
+    for name, x in results:
+        if x is None:
+            print(red('    %-10s request failed' % name))
+            continue
+
+        link = bandwidth * 1000000 / 8.0  # bytes per second
+        line = '    %-10s %6d %10d %10d %6.2f %9.3f %9.3f %9.3f %9.3f %11.3f %11.3f' % (
+            name, x['items'], x['raw'], x['gzip'], float(x['raw']) / max(x['gzip'], 1), x['ttfb'], x['time_plain'],
+            x['time_gzip'], x['parse'], x['raw'] / link, x['gzip'] / link)
+
+        if not x['server_gzip']:
+            line += yellow(' (gzip size computed locally)')
+
+        print(line)
+
+    print('\n    Time columns are in seconds; link-* columns are estimated transfer times over a %s Mbit/s link.'
+          % bandwidth)
+
+
+def _print_fields(results, top):
+    print(cyan('\n*** Largest fields ***'))
+
+    for name, x in results:
+        if not x or not x['fields']:
+            continue
+
+        total = float(sum(b for _, b in x['fields']))
+        fields = ', '.join('%s %.0f%%' % (f, b * 100 / total) for f, b in x['fields'][:top])
+        print('    %-10s %s' % (name, fields))
+
+
+def payload(sizes='0', repeat=3, username=ADMIN_USERNAME, password=ADMIN_PASSWORD, bandwidth=10, top=5, endpoints='',
+            dc=DC):
+    """measure raw and gzip compressed response sizes and transfer times of large API responses (sizes=0+50+200)"""
+    sizes = sorted(int(i) for i in _arg_list(sizes))
+    repeat, bandwidth, top = int(repeat), float(bandwidth), int(top)
+    selected = [e for e in ENDPOINTS if not endpoints or e[0] in _arg_list(endpoints)]
+    api = Api(dc=dc, retry_throttled=True)
+
+    try:
+        api.login(username, password)
+    except ApiError as e:
+        abort(red(str(e)))
+
+    defined = 0
+
+    try:
+        for size in sizes:
+            start, defined = defined, max(defined, size)  # Delete also VMs defined before a failure
+            _define_vms(api, start, defined)
+            results = [(name, _measure(api, resource, params, repeat)) for name, resource, params in selected]
+            _print_report(size, results, bandwidth)
+            _print_fields(results, top)
+    finally:
+        _delete_vms(api, defined)
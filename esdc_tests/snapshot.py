@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshot listing scale test.
+
+Snapshot records can be created through the API (the VM must be deployed) or generated as a Django fixture
+(snapshot_fixture task) and loaded into the database on the management server. The VM (use a test VM), its node and
+the zpool of the disk are looked up through the API; the storage primary key is read with ctl.sh shell. The fixture
+records use primary keys starting at 100000 (start argument), so that they do not overwrite existing snapshots, and
+are removed by the snapshot_cleanup task (same count and start):
+
+    bin/estest.py snapshot_fixture:hostname=<vm>,count=1000 && $ERIGONES_HOME/bin/ctl.sh loaddata /tmp/snapshots.json
+    bin/estest.py snapshot_scale:hostname=<vm>,create=false
+    bin/estest.py snapshot_cleanup:count=1000
+
+For every snapshot count, the snapshot list (names, full and paged) is timed. Snapshots created through the API are
+deleted after every count level (deletion throughput for every count) and created again for the next level.
+"""
+
+import json
+import time
+
+from esdc_tests import common
+from esdc_tests.common import DC, ADMIN_USERNAME, ADMIN_PASSWORD, STATUS_CODES_OK, abort, red, cyan, _es_json, \
+    _arg_list, _arg_bool, _ctl_shell
+from esdc_tests.bench import LatencyStats, _timed_es_json, _print_latency_report
+
+SNAPNAME = 'scale%05d'
+SNAPSHOT_NOTE = 'estest snapshot scale test'
+STORAGE_PK = "from vms.models import NodeStorage; print(NodeStorage.objects.get(node__hostname='%s', zpool='%s').pk)"
+DELETE_SNAPSHOTS = "from vms.models import Snapshot; Snapshot.objects.filter(pk__gte=%d, pk__lt=%d, note='%s').delete()"
+
+SNAPSHOT_TYPE_MANUAL = 1
+SNAPSHOT_STATUS_OK = 1
+
+
+def _login(username, password):
+    status, text = _es_json('login -username %s -password %s' % (username, password), dc=None)
+
+    if status != 200:
+        abort(red('login failed: %s' % text))
+
+
+def _api_result(cmd, dc):
+    status, text = _es_json(cmd, dc=dc)
+
+    if status != 200:
+        abort(red('%s failed (status=%s): %s' % (cmd, status, text)))
+
+    return text['result']
+
+
+def _storage_pk(node, zpool):
+    """Return primary key of a node storage (not available in the API)"""
+    res = _ctl_shell(STORAGE_PK % (node, zpool))
+
+    try:
+        return int(res.splitlines()[-1])
+    except (ValueError, IndexError):
+        return abort(red('Could not get storage %s on node %s: %s' % (zpool, node, res)))
+
+
+def snapshot_fixture(count=1000, hostname='', disk_id=1, zpool='', output='/tmp/snapshots.json', start=100000,
+                     username=ADMIN_USERNAME, password=ADMIN_PASSWORD, dc=DC):
+    """generate fixture with snapshot records of a test VM (load with ctl.sh loaddata, remove with snapshot_cleanup)"""
+    if not hostname:
+        abort(red('missing hostname of the VM'))
+
+    count, disk_id, start = int(count), int(disk_id), int(start)
+    common.ECHO_COMMANDS = False
+    _login(username, password)
+    vm = _api_result('get /vm/%s' % hostname, dc)
+
+    if not vm.get('node'):
+        abort(red('VM %s is not on a node' % hostname))
+
+    if not zpool:
+        zpool = _api_result('get /vm/%s/define/disk/%d' % (hostname, disk_id), dc)['zpool']
+
+    ns = _storage_pk(vm['node'], zpool)
+    now = time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime())
+    objects = []
+
+    for i in range(start, start + count):
+        objects.append({
+            'pk': i,
+            'model': 'vms.snapshot',
+            'fields': {
+                'name': SNAPNAME % i,
+                'vm': vm['uuid'],
+                'disk_id': disk_id,
+                'zpool': ns,
+                'define': None,
+                'type': SNAPSHOT_TYPE_MANUAL,
+                'status': SNAPSHOT_STATUS_OK,
+                'size': 0,
+                'note': SNAPSHOT_NOTE,
+                'created': now,
+                'changed': now,
+            }
+        })
+
+    with open(output, 'w') as f:
+        json.dump(objects, f, indent=4)
+
+    print('%d snapshot records for %s written to %s' % (count, hostname, output))
+
+
+def snapshot_cleanup(count=1000, start=100000):
+    """remove snapshot records loaded from a snapshot_fixture (on the management server only)"""
+    count, start = int(count), int(start)
+
+    if _ctl_shell(DELETE_SNAPSHOTS % (start, start + count, SNAPSHOT_NOTE)).failed:
+        abort(red('could not remove snapshot records %d-%d' % (start, start + count - 1)))
+
+    print('Snapshot records %d-%d removed' % (start, start + count - 1))
+
+
+def _snapshot_count(hostname, dc):
+    status, text = _es_json('get /vm/%s/snapshot' % hostname, dc=dc)
+
+    if status != 200:
+        abort(red('Could not list snapshots of %s (status=%s): %s' % (hostname, status, text)))
+
+    return len(text['result'])
+
+
+def _page_count(hostname, dc):
+    status, text = _es_json('get /vm/%s/snapshot -page 1' % hostname, dc=dc)
+
+    try:
+        per_page = max(len(text['results']), 1)
+        return max((text['count'] + per_page - 1) // per_page, 1)
+    except (KeyError, TypeError):
+        return 1
+
+
+def _time_lists(hostname, count, repeat, dc):
+    """Time full list, names list and first/middle/last page of the snapshot list"""
+    stats = [LatencyStats('%d snapshots: list' % count), LatencyStats('%d snapshots: list -full' % count)]
+    cmds = ['get /vm/%s/snapshot' % hostname, 'get /vm/%s/snapshot -full' % hostname]
+    pages = _page_count(hostname, dc)
+
+    for name, page in (('first', 1), ('middle', (pages + 1) // 2), ('last', pages)):
+        stats.append(LatencyStats('%d snapshots: page %d (%s)' % (count, page, name)))
+        cmds.append('get /vm/%s/snapshot -page %d' % (hostname, page))
+
+    for _ in range(repeat):
+        for s, cmd in zip(stats, cmds):
+            status, _, duration = _timed_es_json(cmd, dc=dc)
+            s.add(duration, status)
+
+    return stats
+
+
+def _create_snapshot(hostname, i, disk_id, stats, dc):
+    status, text, duration = _timed_es_json('create /vm/%s/snapshot/%s -disk_id %d' % (hostname, SNAPNAME % i,
+                                                                                        disk_id), dc=dc)
+    stats.add(duration, status)
+
+    if status not in STATUS_CODES_OK:
+        abort(red('Could not create snapshot %s (status=%s): %s' % (SNAPNAME % i, status, text)))
+
+
+def _delete_snapshots(hostname, count, disk_id, dc):
+    stats = LatencyStats('delete %d snapshots' % count)
+    start = time.time()
+
+    for i in range(count):
+        status, _, duration = _timed_es_json('delete /vm/%s/snapshot/%s -disk_id %d' % (hostname, SNAPNAME % i,
+                                                                                         disk_id), dc=dc)
+        stats.add(duration, status)
+
+    return stats, time.time() - start
+
+
+def snapshot_scale(hostname='', counts='10+100+500', create=True, delete=True, disk_id=1, repeat=5,
+                   username=ADMIN_USERNAME, password=ADMIN_PASSWORD, dc=DC):
+    """measure snapshot list latency, paging and deletion throughput for growing numbers of snapshots"""
+    if not hostname:
+        abort(red('missing hostname of the VM'))
+
+    counts = sorted(int(i) for i in _arg_list(counts))
+    create = _arg_bool(create)
+    delete = create and _arg_bool(delete)
+    disk_id, repeat = int(disk_id), int(repeat)
+    common.ECHO_COMMANDS = False
+    _login(username, password)
+
+    if not create:  # Snapshots were loaded from a fixture
+        counts = [_snapshot_count(hostname, dc)]
+
+    stats = []
+    throughput = []
+    create_stats = LatencyStats('create snapshot')
+    created = 0
+
+    try:
+        for count in counts:
+            if create:
+                print(cyan('*** Creating snapshots %d - %d ***' % (created, count - 1)))
+
+                for i in range(created, count):
+                    _create_snapshot(hostname, i, disk_id, create_stats, dc)
+                    created = i + 1
+
+            stats.extend(_time_lists(hostname, count, repeat, dc))
+
+            if delete:
+                print(cyan('*** Deleting %d snapshots ***' % created))
+                delete_stats, delete_time = _delete_snapshots(hostname, created, disk_id, dc)
+                stats.append(delete_stats)
+                throughput.append((created, created / delete_time))
+                created = 0
+    finally:
+        if delete and created:  # Interrupted
+            _delete_snapshots(hostname, created, disk_id, dc)
+
+    if create:
+        stats.append(create_stats)
+
+    _print_latency_report('Snapshot list scale test of %s' % hostname, stats)
+
+    for count, rate in throughput:
+        print('    %d snapshots: deletion throughput %.2f snapshots/s' % (count, rate))
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+Long running soak test.
+
+Existing read tests and a define/delete cycle are run in a weighted random mix for hours. Client-side latency
+percentiles are computed for consecutive time windows and, when running on the API server, RSS of the API and worker
+processes is read from /proc. A metric with a sustained upward trend over the last windows is flagged.
+
+Define cycles are paced below the define request rate (define_rate argument, rate from the throttling profile saved
+by the throttle task or a conservative default), so that throttled requests do not distort the latency windows; a read
+test runs instead of a define cycle which would come too early. With interval=N, a new test starts at most every N
+seconds.
+"""
+
+import os
+import time
+import random
+from collections import deque
+
+from esdc_tests import common
+from esdc_tests.common import abort, red, cyan, _es_json, _arg_list, _throttle_profile
+from esdc_tests.bench import _percentile
+from esdc_tests import suites
+
+READ_TESTS = (
+    suites._vm__get_200,
+    suites._vm_define_get_200,
+    suites._vm_status_get_200,
+    suites._task__get_200,
+    suites._task_log_get_200,
+)
+
+DEFINE_CYCLE = (
+    suites._vm_define_create_201_1,
+    suites._vm_define_get_200_1,
+    suites._vm_define_disk_1_create_201,
+    suites._vm_define_delete_200_1,
+)
+
+HISTORY = 1000  # Max. number of window summaries kept in memory
+DEFINE_WRITES = 3  # Define requests (create, disk create, delete) in one DEFINE_CYCLE
+DEFAULT_DEFINE_RATE = 0.3  # req/s; the vm suite needs a throttling break after about 20 define writes
+RATE_MARGIN = 0.8
+
+
+def _rss(pattern):
+    """Return total RSS (in kB) of processes with pattern in their command line (None if no process was found)"""
+    if not os.path.isdir('/proc/self'):
+        return None
+
+    total = 0
+    found = False
+
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+
+        try:
+            with open('/proc/%s/cmdline' % pid, 'rb') as f:
+                cmdline = f.read().replace(b'\0', b' ').decode('utf-8', 'replace')
+
+            if pattern not in cmdline or 'estest' in cmdline:
+                continue
+
+            with open('/proc/%s/status' % pid) as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+                        found = True
+                        break
+        except (IOError, OSError, ValueError):  # Process has gone away
+            continue
+
+    return total if found else None
+
+
+def _upward_trend(values, min_increase):
+    """True if values are growing: positive least squares slope, mostly increasing steps and a total increase of
+    at least min_increase (relative to the first value according to the fitted line)"""
+    n = len(values)
+
+    if n < 3:
+        return False
+
+    mean_x = (n - 1) / 2.0
+    mean_y = sum(values) / float(n)
+    var_x = sum((x - mean_x) ** 2 for x in range(n))
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(range(n), values)) / var_x
+    start = mean_y - slope * mean_x
+
+    if slope <= 0 or start <= 0:
+        return False
+
+    increasing = sum(1 for a, b in zip(values, values[1:]) if b > a)
+
+    return increasing >= 0.7 * (n - 1) and slope * (n - 1) / start >= min_increase
+
+
+def _parse_mix(mix):
+    weights = {}
+
+    for item in _arg_list(mix):
+        name, _, weight = item.partition(':')
+
+        if name not in ('read', 'define'):
+            abort(red('unknown soak mix item "%s" (allowed: read, define)' % name))
+
+        weights[name] = int(weight or 1)
+
+    return weights
+
+
+class _Window(object):
+    def __init__(self, start):
+        self.start = start
+        self.samples = []
+        self.failed = 0
+
+    def summary(self, rss):
+        values = sorted(self.samples)
+        x = {'start': self.start, 'count': len(values), 'failed': self.failed}
+
+        for p in (50, 90, 99):
+            x['p%d' % p] = _percentile(values, p)
+
+        for name, kb in rss.items():
+            x['rss:' + name] = kb
+
+        return x
+
+
+def _print_window(x, rss_names):
+    if not x['count']:
+        return
+
+    line = '    %s %6d %6d %9.3f %9.3f %9.3f' % (time.strftime('%H:%M:%S', time.localtime(x['start'])), x['count'],
+                                               x['failed'], x['p50'], x['p90'], x['p99'])
+
+    for name in rss_names:
+        kb = x.get('rss:' + name)
+        line += ' %12s' % ('-' if kb is None else '%d' % kb)
+
+    print(line)
+
+
+def _check_trends(history, metrics, windows, min_increase):
+    flagged = []
+
+    if len(history) < windows:
+        return flagged
+
+    last = list(history)[-windows:]
+
+    for metric in metrics:
+        values = [x.get(metric) for x in last]
+
+        if None in values:
+            continue
+
+        if _upward_trend(values, min_increase):
+            flagged.append(metric)
+            print(red('    TREND: %s grew from %s to %s over the last %d windows' % (
+                metric, _fmt(values[0]), _fmt(values[-1]), windows)))
+
+    return flagged
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        return '%.3f' % value
+    return str(value)
+
+
+def _define_interval(rate):
+    """Return minimal seconds between define cycles, so that define requests are not throttled"""
+    if not rate:
+        rate = _throttle_profile().get('define', {}).get('rate') or DEFAULT_DEFINE_RATE
+
+    return DEFINE_WRITES / (rate * RATE_MARGIN)
+
+
+def soak(hours=1, mix='read:9+define:1', window=300, trend=6, increase=0.1, procs='gunicorn+celery', interval=0,
+         define_rate=0, seed=None):
+    """run a mix of read and define/delete tests for hours and flag growing latency and process memory"""
+    duration = float(hours) * 3600
+    window, trend, increase, interval = float(window), int(trend), float(increase), float(interval)
+    weights = _parse_mix(mix)
+    rss_names = _arg_list(procs)
+    rng = random.Random(seed)
+    population = [name for name, weight in weights.items() for _ in range(weight)]
+    common.ECHO_COMMANDS = False
+    common.VERBOSE = False
+
+    suites.ping()
+
+    if 'define' in weights:
+        suites._create_test_user()
+
+    suites._accounts_login_admin_good()
+
+    history = deque(maxlen=HISTORY)
+    flagged = set()
+    start = time.time()
+    current = _Window(start)
+    metrics = ['p50', 'p90', 'p99'] + ['rss:' + name for name in rss_names]
+
+    define_interval = _define_interval(float(define_rate))
+    last_define = 0
+
+    print(cyan('*** Soak test for %s hours, %ss windows ***' % (hours, int(window))))
+
+    if 'define' in weights:
+        print('    define cycles at most every %.1fs' % define_interval)
+
+    print('    %-8s %6s %6s %9s %9s %9s' % ('window', 'count', 'failed', 'p50', 'p90', 'p99') +
+          ''.join(' %12s' % ('rss:' + name)[:12] for name in rss_names))
+
+    try:
+        while time.time() - start < duration:
+            started = time.time()
+
+            if rng.choice(population) == 'define' and started - last_define >= define_interval:
+                tests = DEFINE_CYCLE
+                last_define = started
+            else:
+                tests = (rng.choice(READ_TESTS),)
+
+            for test in tests:
+                failed = common.TESTS_FAIL
+                t = time.time()
+                test()
+                current.samples.append(time.time() - t)
+
+                if common.TESTS_FAIL != failed:
+                    current.failed += 1
+
+            now = time.time()
+
+            if now - current.start >= window:
+                x = current.summary(dict((name, _rss(name)) for name in rss_names))
+                history.append(x)
+                _print_window(x, rss_names)
+                flagged.update(_check_trends(history, metrics, trend, increase))
+                current = _Window(now)
+
+            pause = started + interval - time.time()
+
+            if pause > 0:
+                time.sleep(pause)
+    except KeyboardInterrupt:
+        print(red('\nSoak test interrupted'))
+    finally:
+        if 'define' in weights:
+            _es_json('delete /vm/test99.example.com/define')  # Cleanup of an interrupted define/delete cycle
+            suites._delete_test_user()
+
+    print(cyan('\n*** Soak test finished after %d windows ***' % len(history)))
+
+    for metric in sorted(flagged):
+        common.TESTS_WARN += 1
+        print(red('    sustained upward trend: %s' % metric))
+
+    common._summary()
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental task log consumer.
+
+The task log is returned newest first. Instead of re-reading it from the start, the reader remembers a cursor (time of
+the newest seen entry and task IDs seen at that time) and on every poll reads pages only until it reaches the cursor.
+"""
+
+import sys
+import time
+import calendar
+from collections import deque, defaultdict
+
+from esdc_tests import common
+from esdc_tests.common import DC, abort, red, yellow, cyan, _es_json, _arg_bool, _task_prefix_from_task_id
+
+TASK_LOG_CMD = 'get /task/log -page %d'
+MAX_PAGES = 10  # Max. number of pages read in one poll (bounds memory used by one poll)
+
+
+def _entry_task_id(entry):
+    return entry.get('task') or entry.get('task_id') or ''
+
+
+def _entry_time(entry):
+    return entry.get('time') or ''
+
+
+def _parse_time(value):
+    """Convert ISO 8601 UTC timestamp returned by the API to unix time"""
+    value = value.rstrip('Z').split('+')[0]
+    base, _, frac = value.partition('.')
+
+    try:
+        ts = calendar.timegm(time.strptime(base, '%Y-%m-%dT%H:%M:%S'))
+    except ValueError:
+        return None
+
+    if frac:
+        ts += float('0.' + frac)
+
+    return ts
+
+
+def _task_log_page(page, dc=DC):
+    """Return (entries, has_next) for one task log page"""
+    status, text = _es_json(TASK_LOG_CMD % page, dc=dc)
+
+    if status != 200:
+        raise RuntimeError('Task log request failed (status=%s): %s' % (status, text))
+
+    if isinstance(text, dict):  # paginated response
+        return text.get('results') or [], bool(text.get('next'))
+
+    return text or [], False
+
+
+class TaskLogCursor(object):
+    """Position in the task log: time of the newest seen entry and task IDs already seen at that time"""
+    def __init__(self, timestamp='', seen=()):
+        self.time = timestamp
+        self.seen = set(seen)
+        self.dropped = 0  # New entries skipped because of the max_pages limit
+
+    def __repr__(self):
+        return '<TaskLogCursor time=%s seen=%d>' % (self.time, len(self.seen))
+
+    def is_new(self, entry):
+        t = _entry_time(entry)
+        return t > self.time or (t == self.time and self._key(entry) not in self.seen)
+
+    @staticmethod
+    def _key(entry):
+        return _entry_task_id(entry), entry.get('status')
+
+    def advance(self, entries):
+        """Move cursor to the newest entry from a list of new entries (ordered oldest first)"""
+        for entry in entries:
+            t = _entry_time(entry)
+
+            if t > self.time:
+                self.time = t
+                self.seen = set()
+
+            if t == self.time:
+                self.seen.add(self._key(entry))
+
+
+def _task_log_new_entries(cursor, dc=DC, max_pages=MAX_PAGES):
+    """Read task log pages until the cursor is reached and return (new entries ordered oldest first, dropped).
+
+    Only max_pages pages are kept; older new entries are counted (dropped > 0 means that the result is truncated).
+    """
+    new = []
+    dropped = 0
+    page = 1
+
+    while True:
+        entries, has_next = _task_log_page(page, dc=dc)
+        reached = False
+
+        for entry in entries:
+            if not cursor.is_new(entry):
+                reached = True
+                break
+            elif page <= max_pages:
+                new.append(entry)
+            else:
+                dropped += 1
+
+        if reached or not has_next:
+            break
+
+        page += 1
+
+    new.reverse()
+
+    return new, dropped
+
+
+def _task_log_cursor(backfill=False, dc=DC):
+    """Return new cursor at the current end of the task log (or at its start if backfill is True)"""
+    cursor = TaskLogCursor()
+
+    if not backfill:
+        entries, _ = _task_log_page(1, dc=dc)
+        entries.reverse()
+        cursor.advance(entries)
+
+    return cursor
+
+
+def _task_log_stream(cursor=None, interval=5, dc=DC, max_pages=MAX_PAGES, backfill=False, heartbeat=False):
+    """Generator yielding new task log entries as they appear (oldest first).
+
+    If no cursor is given, the stream starts at the current end of the task log unless backfill is True.
+    With heartbeat=True the generator also yields None after every poll without new entries.
+    Entries dropped because of max_pages are counted in cursor.dropped.
+    """
+    if cursor is None:
+        cursor = _task_log_cursor(backfill=backfill, dc=dc)
+
+    while True:
+        entries, dropped = _task_log_new_entries(cursor, dc=dc, max_pages=max_pages)
+
+        if dropped:
+            cursor.dropped += dropped
+            print(yellow('WARNING: %d task log entries older than %d pages were skipped (%d in total)' % (
+                dropped, max_pages, cursor.dropped)))
+
+        cursor.advance(entries)
+
+        for entry in entries:
+            yield entry
+
+        if heartbeat and not entries:
+            yield None
+
+        time.sleep(interval)
+
+
+class TaskThroughput(object):
+    """Sliding window counter of task log entries per task type and status"""
+    def __init__(self, window=60):
+        self.window = window
+        self.total = 0
+        self.totals = defaultdict(int)
+        self._events = deque()
+
+    def add(self, entry):
+        ts = _parse_time(_entry_time(entry)) or time.time()
+        task_id = _entry_task_id(entry)
+
+        if task_id:
+            task_type = _task_prefix_from_task_id(task_id)[1]
+        else:
+            task_type = '?'
+
+        key = (task_type, str(entry.get('status', '')))
+        self.total += 1
+        self.totals[key] += 1
+        self._events.append((ts, key))
+        self._expire(ts)
+
+    def _expire(self, now):
+        limit = now - self.window
+
+        while self._events and self._events[0][0] < limit:
+            self._events.popleft()
+
+    def rates(self, now=None):
+        """Return dict of (task type, status) -> entries per minute in the current window"""
+        if now is not None:
+            self._expire(now)
+
+        counts = defaultdict(int)
+
+        for _, key in self._events:
+            counts[key] += 1
+
+        return dict((key, count * 60.0 / self.window) for key, count in counts.items())
+
+
+def _print_throughput(counter, now=None, dropped=0):
+    rates = counter.rates(now=now)
+    print(cyan('*** Task log throughput (last %ss, total entries: %d) ***' % (counter.window, counter.total)))
+
+    if dropped:
+        print(yellow('    %d entries skipped (not counted) - decrease the interval' % dropped))
+
+    if not rates:
+        print('    no entries')
+
+    for (task_type, status), rate in sorted(rates.items()):
+        print('    type=%-2s status=%-10s %8.2f/min' % (task_type, status, rate))
+
+
+def tasklog(interval=5, report=60, window=60, duration=0, username='', password='', backfill=False, dc=DC):
+    """follow the task log and print throughput per task type (interval, report, window, duration in seconds)"""
+    interval, report, window, duration = float(interval), float(report), float(window), float(duration)
+    common.ECHO_COMMANDS = False
+
+    if username:
+        status, text = _es_json('login -username %s -password %s' % (username, password), dc=None)
+
+        if status != 200:
+            abort(red('login failed: %s' % text))
+
+    try:
+        cursor = _task_log_cursor(backfill=_arg_bool(backfill), dc=dc)
+    except RuntimeError as e:
+        return abort(red(str(e)))
+
+    counter = TaskThroughput(window=window)
+    start = last_report = time.time()
+
+    try:
+        for entry in _task_log_stream(cursor=cursor, interval=interval, dc=dc, heartbeat=True):
+            if entry is not None:
+                counter.add(entry)
+                print('%s %s %s %s' % (_entry_time(entry), _entry_task_id(entry), entry.get('status', ''),
+                                       entry.get('msg', '')))
+                sys.stdout.flush()
+
+            now = time.time()
+
+            if now - last_report >= report:
+                _print_throughput(counter, now=now, dropped=cursor.dropped)
+                last_report = now
+
+            if duration and now - start >= duration:
+                break
+    except RuntimeError as e:
+        abort(red(str(e)))
+    finally:
+        _print_throughput(counter, dropped=cursor.dropped)
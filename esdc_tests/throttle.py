@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+API throttling calibration.
+
+For every endpoint class the calibration runs three phases:
+
+ 1. burst - sequential requests until the first 429 response (number of successful requests = burst size),
+ 2. penalty - slow probing until the endpoint accepts requests again,
+ 3. ramp - fixed request rates around the estimated sustained rate (burst / window) until throttling starts.
+
+The discovered limits are saved into a profile file (THROTTLE_PROFILE), which is used by other runs (see
+common._throttle_pause()).
+"""
+
+import json
+import time
+import threading
+
+from esdc_tests.common import DC, ADMIN_USERNAME, ADMIN_PASSWORD, THROTTLE_PROFILE, abort, red, green, yellow, cyan, \
+    _throttle_profile, _arg_list, _arg_bool
+from esdc_tests.bench import _run_concurrent
+from esdc_tests.api import THROTTLED, Api, ApiError
+
+HOSTNAME = 'throttle-test.example.com'
+RAMP_FACTORS = (0.5, 0.75, 0.9, 1.0, 1.1, 1.25)
+
+
+def _auth_request(api, i, username, password):
+    return api.request('POST', '/accounts/login', params={'username': username, 'password': password}, dc=False)
+
+
+def _read_request(api, i, username, password):
+    return api.es('get', '/vm')
+
+
+def _define_request(api, i, username, password):
+    return api.es('set', '/vm/%s/define' % HOSTNAME, ram=256 + 32 * (i % 8))
+
+
+# Auth requests create new API tokens, so they are calibrated last
+ENDPOINT_CLASSES = (
+    ('read', _read_request),
+    ('define', _define_request),
+    ('auth', _auth_request),
+)
+
+
+class _Calibration(object):
+    """Sends requests of one endpoint class; every thread uses its own API connection with a shared token"""
+    def __init__(self, master, fun, username, password):
+        self.master = master
+        self.fun = fun
+        self.username = username
+        self.password = password
+        self._local = threading.local()
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def _api(self):
+        api = getattr(self._local, 'api', None)
+
+        if api is None:
+            api = self._local.api = Api(url=self.master.url, dc=self.master.dc)
+            api.token = self.master.token
+
+        return api
+
+    def send(self):
+        """Send one request and return its Response"""
+        with self._lock:
+            self._counter += 1
+            i = self._counter
+
+        return self.fun(self._api(), i, self.username, self.password)
+
+    def burst(self, max_requests):
+        """Return (number of requests accepted before the first 429, duration, first 429 Response or None)"""
+        start = time.time()
+
+        for i in range(max_requests):
+            res = self.send()
+
+            if res.status == THROTTLED:
+                return i, time.time() - start, res
+
+        return max_requests, time.time() - start, None
+
+    def penalty(self, probe, max_penalty):
+        """Return seconds until a throttled endpoint accepts requests again (None if still throttled)"""
+        start = time.time()
+
+        while time.time() - start < max_penalty:
+            time.sleep(probe)
+
+            if self.send().status != THROTTLED:
+                return time.time() - start
+
+        return None
+
+    def paced(self, rate, duration, workers):
+        """Send requests at fixed rate for duration seconds and return number of throttled responses"""
+        count = max(int(rate * duration), 1)
+        start = time.time()
+
+        def job(n):
+            def send():
+                delay = start + n / rate - time.time()
+
+                if delay > 0:
+                    time.sleep(delay)
+
+                return self.send().status
+            return send
+
+        return sum(1 for status in _run_concurrent([job(n) for n in range(count)], workers) if status == THROTTLED)
+
+
+def _retry_after(res):
+    try:
+        return float(res.header('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _calibrate(cal, max_requests, probe, max_penalty, ramp, workers):
+    limits = {}
+    burst, burst_time, res = cal.burst(max_requests)
+
+    if burst == 0:  # Penalty left from a previous run or shared with another endpoint class
+        print(yellow('    throttled from the first request, waiting for the penalty to expire'))
+
+        if cal.penalty(probe, max_penalty) is None:
+            print(red('    still throttled after %ss' % max_penalty))
+            limits.update(burst=0, burst_time=0, throttled=True)
+            return limits
+
+        burst, burst_time, res = cal.burst(max_requests)
+
+    limits['burst'] = burst
+    limits['burst_time'] = round(burst_time, 3)
+
+    if res is None:
+        print(green('    no throttling after %d requests in %.1fs' % (burst, burst_time)))
+        limits['throttled'] = False
+        return limits
+
+    limits['throttled'] = True
+    limits['retry_after'] = _retry_after(res)
+    print(yellow('    burst: %d requests in %.1fs (Retry-After: %s)' % (burst, burst_time, limits['retry_after'])))
+
+    penalty = cal.penalty(probe, max_penalty)
+
+    if penalty is None:
+        print(red('    still throttled after %ss' % max_penalty))
+        return limits
+
+    limits['penalty'] = round(penalty, 1)
+    # Sliding window: the first request of the burst expires after window seconds
+    limits['window'] = round(burst_time + penalty, 1)
+    limits['rate'] = round(burst / limits['window'], 3)
+    print('    penalty: %.1fs, estimated window: %.1fs, estimated rate: %.3f req/s' % (
+        penalty, limits['window'], limits['rate']))
+
+    if not ramp:
+        return limits
+
+    if limits['rate'] <= 0:
+        print(red('    no request accepted in the burst phase, skipping the rate ramp'))
+        return limits
+
+    estimate = limits['rate']
+    step = limits['window'] * 1.5
+    tested = limits['tested_rates'] = {}
+
+    for factor in RAMP_FACTORS:
+        rate = estimate * factor
+        time.sleep(limits['window'])  # Start every step with an empty window
+        throttled = cal.paced(rate, step, workers)
+        tested['%.3f' % rate] = throttled
+        print('    %.3f req/s for %.0fs: %d throttled' % (rate, step, throttled))
+
+        if throttled:
+            break
+
+        limits['rate'] = round(rate, 3)
+
+    time.sleep(limits['window'])
+
+    return limits
+
+
+def _save_profile(path, api_url, classes):
+    profile = {'classes': _throttle_profile(path)}  # Keep classes which were not calibrated in this run
+    profile['classes'].update(classes)
+    profile['api_url'] = api_url
+    profile['created'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+
+    with open(path, 'w') as f:
+        json.dump(profile, f, indent=4, sort_keys=True)
+
+
+def throttle(classes='read+define+auth', username=ADMIN_USERNAME, password=ADMIN_PASSWORD, max_requests=1000, probe=2,
+             max_penalty=3600, ramp=True, workers=8, profile=THROTTLE_PROFILE, dc=DC):
+    """find API throttling limits (burst, rate, penalty) per endpoint class and save them into a profile file"""
+    max_requests, probe, max_penalty, workers = int(max_requests), float(probe), float(max_penalty), int(workers)
+    ramp = _arg_bool(ramp)
+    selected = _arg_list(classes)
+    api = Api(dc=dc)
+
+    try:
+        api.login(username, password)
+    except ApiError as e:
+        abort(red(str(e)))
+
+    results = {}
+    setup = Api(url=api.url, dc=dc, retry_throttled=True)  # Setup and cleanup must not fail because of throttling
+    setup.token = api.token
+
+    if 'define' in selected:
+        res = setup.es('create', '/vm/%s/define' % HOSTNAME, alias='throttle-test', vcpus=1, ram=256, ostype=1)
+
+        if res.status not in (201, 406):
+            abort(red('could not define test VM %s (status=%s): %s' % (HOSTNAME, res.status, res.text)))
+
+    try:
+        for name, fun in ENDPOINT_CLASSES:
+            if name not in selected:
+                continue
+
+            print(cyan('*** Calibrating %s requests ***' % name))
+            results[name] = _calibrate(_Calibration(api, fun, username, password), max_requests, probe, max_penalty,
+                                       ramp, workers)
+    finally:
+        if 'define' in selected:
+            setup.es('delete', '/vm/%s/define' % HOSTNAME)
+
+        if results:
+            _save_profile(profile, api.url, results)
+            print(cyan('\n*** Throttling profile saved into %s ***' % profile))